@@ -0,0 +1,329 @@
+"""
+Synthetic payloads shaped like DeFiLlama API responses, at realistic sizes.
+
+Every generator is deterministic, so benchmark runs are comparable. Sizes are
+taken from SIZES and can be scaled down with scaled_sizes().
+"""
+import json
+import random
+import zlib
+
+DAY = 86400
+GENESIS = 1530230400 # first date of DeFiLlama's TVL history
+
+# number of records in the largest payloads
+SIZES = dict(
+    protocols=5000,      # /protocols
+    pools=15000,         # /pools
+    tokens=1000,         # tokens priced in historical price benchmarks
+    hours=8760,          # hours of price history per token (one year)
+    days=1800,           # days in daily time series
+    chains=200,          # /chains
+    protocol_chains=12,  # chains of one protocol in /protocol/{name}
+    protocol_tokens=25,  # tokens held by one protocol per chain and date
+    stablecoins=150,
+    dexes=800,
+    bridges=100,
+    bridge_txs=6000,
+    events=100000,       # timestamps resolved to blocks
+)
+
+
+def scaled_sizes(scale):
+    """ SIZES multiplied by `scale`, keeping every size at least 1. """
+    return {k: max(int(v * scale), 1) for k, v in SIZES.items()}
+
+
+def _chains(n):
+    return ['Ethereum', 'Arbitrum', 'BSC', 'Polygon', 'Avalanche', 'Optimism',
+            'Fantom', 'Solana', 'Tron', 'Base'][:n] + \
+        [f'Chain{i}' for i in range(max(n - 10, 0))]
+
+
+def token_keys(n):
+    """ chain:address keys of `n` tokens, as a {address: chain} dict. """
+    chains = ['ethereum', 'arbitrum', 'avax', 'bsc', 'polygon']
+    return {f'0x{i:040x}': chains[i % len(chains)] for i in range(n)}
+
+
+def symbol_of(coin):
+    """ Deterministic symbol of a chain:address key. """
+    return 'T' + coin.split(':', 1)[1][-6:].upper()
+
+
+def price_at(coin, ts):
+    """ Deterministic price of a token at a unix timestamp. """
+    return 1 + zlib.crc32(coin.encode()) % 1000 / 10 + (ts % 7919) / 7919
+
+
+class Payloads:
+    """ Generates the payload of each endpoint. """
+
+    def __init__(self, sizes=None):
+        self.sizes = dict(SIZES, **(sizes or {}))
+        self.rng = random.Random(42)
+
+    def _daily(self, n=None):
+        n = n or self.sizes['days']
+        return [GENESIS + i * DAY for i in range(n)]
+
+    # --- TVL --- #
+
+    def tvl_series(self):
+        return [{'date': str(ts), 'totalLiquidityUSD': self.rng.random() * 1e9}
+                for ts in self._daily()]
+
+    def chains(self):
+        return [{'gecko_id': name.lower(), 'tvl': self.rng.random() * 1e9,
+                 'tokenSymbol': name[:3].upper(), 'cmcId': str(i),
+                 'name': name, 'chainId': i}
+                for i, name in enumerate(_chains(self.sizes['chains']))]
+
+    def protocols(self):
+        chains = _chains(20)
+        cats = ['Dexes', 'Lending', 'CDP', 'Yield', 'Bridge', 'Derivatives',
+                'Liquid Staking', 'CEX', 'Chain']
+        res = []
+        for i in range(self.sizes['protocols']):
+            own = chains[i % 20:i % 20 + 1 + i % 3]
+            res.append(dict(
+                id=str(i), name=f'Protocol {i}', address=None,
+                symbol=f'P{i}', url=f'https://protocol{i}.xyz',
+                description='Synthetic protocol ' * 5, chain=own[0],
+                logo=f'https://icons.llama.fi/protocol-{i}.png', audits='2',
+                gecko_id=f'protocol-{i}', cmcId=str(i), category=cats[i % 9],
+                chains=own, module=f'protocol-{i}/index.js',
+                twitter=f'protocol{i}', forkedFrom=[], oracles=['Chainlink'],
+                listedAt=1600000000 + i,
+                slug=f'protocol-{i}',
+                parentProtocol=f'parent#parent-{i // 4}' if i % 3 == 0 else None,
+                tvl=self.rng.random() * 1e8,
+                chainTvls={c: self.rng.random() * 1e7 for c in own},
+                change_1h=self.rng.random(), change_1d=self.rng.random(),
+                change_7d=self.rng.random(), mcap=self.rng.random() * 1e9))
+        return res
+
+    def protocol(self, name):
+        chains = _chains(self.sizes['protocol_chains'])
+        days = self._daily()
+        syms = [f'TKN{i}' for i in range(self.sizes['protocol_tokens'])]
+
+        def history():
+            return dict(
+                tvl=[{'date': ts, 'totalLiquidityUSD': self.rng.random() * 1e8}
+                     for ts in days],
+                tokens=[{'date': ts, 'tokens': {s: self.rng.random() * 1e6
+                                                for s in syms}}
+                        for ts in days],
+                tokensInUsd=[{'date': ts, 'tokens': {s: self.rng.random() * 1e6
+                                                     for s in syms}}
+                             for ts in days])
+        chain_tvls = {c: history() for c in chains}
+        chain_tvls['staking'] = history()
+        current = {c: self.rng.random() * 1e8 for c in chains}
+        current['staking'] = self.rng.random() * 1e7
+        return dict(id='1', name=name, symbol='P', category='Lending',
+                    chains=chains, currentChainTvls=current,
+                    chainTvls=chain_tvls, **history())
+
+    # --- coins --- #
+
+    def prices(self, coins, ts):
+        return {'coins': {c: {'decimals': 18, 'symbol': symbol_of(c),
+                              'price': price_at(c, ts), 'timestamp': ts,
+                              'confidence': 0.99} for c in coins}}
+
+    def batch_historical(self, coin_timestamps):
+        return {'coins': {c: {'symbol': symbol_of(c), 'prices': [
+                    {'timestamp': ts + self.rng.randint(-60, 60),
+                     'price': price_at(c, ts), 'confidence': 0.99}
+                    for ts in tss]}
+                for c, tss in coin_timestamps.items()}}
+
+    def chart(self, coins, end, span, period):
+        return {'coins': {c: {'symbol': symbol_of(c), 'confidence': 0.99,
+                              'decimals': 18, 'prices': [
+                    {'timestamp': end - period * i, 'price': price_at(c, i)}
+                    for i in range(span)][::-1]}
+                for c in coins}}
+
+    def block(self, ts):
+        return {'height': (ts - 1438269973) // 12, 'timestamp': ts}
+
+    # --- stablecoins --- #
+
+    def stablecoins(self):
+        chains = _chains(30)
+        res = []
+        for i in range(self.sizes['stablecoins']):
+            amt = lambda: {'peggedUSD': self.rng.random() * 1e9}
+            own = chains[:1 + i % 30]
+            res.append(dict(
+                id=str(i + 1), name=f'Stable {i}', symbol=f'USD{i}',
+                gecko_id=f'stable-{i}', pegType='peggedUSD',
+                priceSource='defillama', pegMechanism='fiat-backed',
+                circulating=amt(), circulatingPrevDay=amt(),
+                circulatingPrevWeek=amt(), circulatingPrevMonth=amt(),
+                chainCirculating={c: dict(current=amt(),
+                                          circulatingPrevDay=amt(),
+                                          circulatingPrevWeek=amt(),
+                                          circulatingPrevMonth=amt())
+                                  for c in own},
+                chains=own, price=1.0))
+        return {'peggedAssets': res}
+
+    def stablecoin_charts(self):
+        amt = lambda: {'peggedUSD': self.rng.random() * 1e9}
+        return [dict(date=str(ts), totalCirculating=amt(),
+                     totalUnreleased=amt(), totalCirculatingUSD=amt(),
+                     totalMintedUSD=amt(), totalBridgedToUSD=amt())
+                for ts in self._daily()]
+
+    def stablecoin_chains(self):
+        return [dict(gecko_id=name.lower(),
+                     totalCirculatingUSD={'peggedUSD': self.rng.random() * 1e9,
+                                          'peggedEUR': self.rng.random() * 1e6},
+                     tokenSymbol=name[:3].upper(), name=name)
+                for name in _chains(self.sizes['chains'])]
+
+    def stablecoin_prices(self):
+        ids = [f'stable-{i}' for i in range(self.sizes['stablecoins'])]
+        return [dict(date=ts, prices={g: 1 + self.rng.random() / 100
+                                      for g in ids})
+                for ts in self._daily()]
+
+    # --- yields --- #
+
+    def pools(self):
+        chains = _chains(20)
+        res = []
+        for i in range(self.sizes['pools']):
+            res.append(dict(
+                chain=chains[i % 20], project=f'protocol-{i % 400}',
+                symbol=f'TKN{i % 50}-TKN{(i + 1) % 50}',
+                tvlUsd=self.rng.random() * 1e7, apyBase=self.rng.random() * 20,
+                apyReward=None if i % 2 else self.rng.random() * 10,
+                apy=self.rng.random() * 30, rewardTokens=None,
+                pool=f'{i:08x}-0000-4000-8000-{i:012x}',
+                apyPct1D=self.rng.random(), apyPct7D=self.rng.random(),
+                apyPct30D=self.rng.random(), stablecoin=bool(i % 5 == 0),
+                ilRisk='no' if i % 3 else 'yes', exposure='multi',
+                predictions=dict(predictedClass='Stable/Up',
+                                 predictedProbability=self.rng.random() * 100,
+                                 binnedConfidence=1 + i % 3),
+                poolMeta=None, mu=self.rng.random() * 20,
+                sigma=self.rng.random(), count=self.rng.randint(1, 900),
+                outlier=False, underlyingTokens=[f'0x{i:040x}'],
+                il7d=None, apyBase7d=None, apyMean30d=self.rng.random() * 20,
+                volumeUsd1d=None, volumeUsd7d=None))
+        return {'status': 'success', 'data': res}
+
+    def pool_chart(self):
+        return {'status': 'success', 'data': [
+            dict(timestamp=f'{y}-{m:02d}-{d:02d}T23:01:15.000Z',
+                 tvlUsd=self.rng.randint(1, 10**8), apy=self.rng.random() * 20,
+                 apyBase=self.rng.random() * 20, apyReward=None, il7d=None,
+                 apyBase7d=None)
+            for y in range(2021, 2024) for m in range(1, 13)
+            for d in range(1, 29)]}
+
+    # --- volumes and fees --- #
+
+    def overview(self):
+        chains = _chains(20)
+        names = [f'dex-{i}' for i in range(self.sizes['dexes'])]
+        protocols = [dict(
+            defillamaId=str(i), name=name, disabled=False, displayName=name,
+            module=name, category='Dexes', logo=f'https://icons/{name}.png',
+            change_1d=self.rng.random(), change_7d=self.rng.random(),
+            change_1m=self.rng.random(), change_7dover7d=self.rng.random(),
+            total24h=self.rng.random() * 1e7, total7d=self.rng.random() * 1e8,
+            total30d=self.rng.random() * 1e9, totalAllTime=None,
+            breakdown24h={c: {name: self.rng.random() * 1e6}
+                          for c in chains[i % 20:i % 20 + 2]},
+            chains=chains[i % 20:i % 20 + 2], protocolType='protocol',
+            methodologyURL='https://github.com/DefiLlama', methodology={},
+            latestFetchIsOk=True, parentProtocol=None)
+            for i, name in enumerate(names)]
+        days = self._daily()
+        return dict(
+            totalDataChart=[[ts, self.rng.random() * 1e9] for ts in days],
+            totalDataChartBreakdown=[
+                [ts, {n: self.rng.random() * 1e6 for n in names[:300]}]
+                for ts in days],
+            protocols=protocols, allChains=chains, chain=None,
+            total24h=1e9, total7d=7e9, change_1d=1.0, change_7d=2.0,
+            change_1m=3.0, change_7dover7d=4.0)
+
+    def summary(self):
+        return dict(name='dex', totalDataChart=[
+            [ts, self.rng.random() * 1e7] for ts in self._daily()])
+
+    # --- bridges --- #
+
+    def _volumes(self):
+        return dict(lastHourlyVolume=self.rng.random() * 1e6,
+                    currentDayVolume=self.rng.random() * 1e7,
+                    lastDailyVolume=self.rng.random() * 1e7,
+                    dayBeforeLastVolume=self.rng.random() * 1e7,
+                    weeklyVolume=self.rng.random() * 1e8,
+                    monthlyVolume=self.rng.random() * 1e9)
+
+    def _txs(self):
+        txs = lambda: dict(deposits=self.rng.randint(0, 10**4),
+                           withdrawals=self.rng.randint(0, 10**4))
+        return dict(lastHourlyTxs=txs(), currentDayTxs=txs(),
+                    prevDayTxs=txs(), dayBeforeLastTxs=txs(),
+                    weeklyTxs=txs(), monthlyTxs=txs())
+
+    def bridges(self):
+        return {'bridges': [dict(
+            id=i + 1, name=f'bridge-{i}', displayName=f'Bridge {i}',
+            icon='chain:ethereum', volumePrevDay=self.rng.random() * 1e7,
+            volumePrev2Day=self.rng.random() * 1e7,
+            chains=_chains(20)[:1 + i % 20], destinationChain='false',
+            **self._volumes())
+            for i in range(self.sizes['bridges'])]}
+
+    def bridge(self, bridge_id):
+        return dict(id=bridge_id, name='bridge', displayName='Bridge',
+                    destinationChain='false',
+                    chainBreakdown={c: dict(**self._volumes(), **self._txs())
+                                    for c in _chains(20)},
+                    **self._volumes(), **self._txs())
+
+    def bridge_volume(self):
+        return [dict(date=str(ts), depositUSD=self.rng.random() * 1e7,
+                     withdrawUSD=self.rng.random() * 1e7,
+                     depositTxs=self.rng.randint(0, 10**4),
+                     withdrawTxs=self.rng.randint(0, 10**4))
+                for ts in self._daily()]
+
+    def bridge_day_stats(self, ts):
+        def tokens():
+            return {f'ethereum:0x{i:040x}': dict(
+                symbol=f'TKN{i}', decimals=18, usdValue=self.rng.random() * 1e6,
+                amount=str(self.rng.randint(1, 10**20))) for i in range(200)}
+
+        def addrs():
+            return {f'ethereum:0x{i:040x}': dict(
+                usdValue=self.rng.random() * 1e5, txs=self.rng.randint(1, 50))
+                for i in range(1000)}
+        return dict(date=ts, totalTokensDeposited=tokens(),
+                    totalTokensWithdrawn=tokens(),
+                    totalAddressDeposited=addrs(),
+                    totalAddressWithdrawn=addrs())
+
+    def transactions(self, limit):
+        return [dict(tx_hash=f'0x{i:064x}', ts=f'2022-12-01T00:{i % 60:02d}:00',
+                     tx_block=16000000 + i, tx_from=f'0x{i:040x}',
+                     tx_to=f'0x{i + 1:040x}', token=f'0x{i % 50:040x}',
+                     amount=str(self.rng.randint(1, 10**20)),
+                     is_deposit=bool(i % 2), chain='ethereum',
+                     usd_value=str(self.rng.random() * 1e5))
+                for i in range(min(int(limit), self.sizes['bridge_txs']))]
+
+
+def dumps(obj):
+    """ Encode a payload the way the API does. """
+    return json.dumps(obj, separators=(',', ':')).encode()
@@ -0,0 +1,356 @@
+"""
+Times every public DefiLlama method end to end against a local stand-in
+server, and splits each timing into network, JSON decode and data frame build
+phases.
+
+    python -m benchmarks.run                    # everything, full size
+    python -m benchmarks.run --scale 0.05       # quick run on smaller payloads
+    python -m benchmarks.run --filter prices    # methods whose name matches
+    python -m benchmarks.run --compact          # with DefiLlama(compact=True)
+
+With the default `--workers 1` requests are sent one at a time and the three
+phases add up to the wall time. With more workers, network and decode are
+the time summed over all threads and build isn't reported. `MB` is the size
+of the responses and `frame MB` the memory used by the returned data frames.
+"""
+import argparse
+import inspect
+import json
+import re
+import tempfile
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import defillama2.defillama2 as dl
+from defillama2 import DefiLlama, PriceStore
+from defillama2.transport import RequestsTransport, Transport
+from .payloads import GENESIS, Payloads, dumps, scaled_sizes, token_keys
+from .server import StandInServer, point_client_at
+
+
+class TimedTransport(Transport):
+    """ Adds up the time spent in and the bytes received by a transport. """
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.seconds = 0.
+        self.nbytes = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, url, params=None):
+        t0 = time.perf_counter()
+        resp = self.transport.fetch(url, params=params)
+        with self._lock:
+            self.seconds += time.perf_counter() - t0
+            self.nbytes += len(resp.content)
+        return resp
+
+    def close(self):
+        self.transport.close()
+
+
+class TimedDefiLlama(DefiLlama):
+    """ DefiLlama that adds up the time spent decoding JSON. """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.decode_seconds = 0.
+        self._decode_lock = threading.Lock()
+
+    def _decode(self, content):
+        t0 = time.perf_counter()
+        res = super()._decode(content)
+        with self._decode_lock:
+            self.decode_seconds += time.perf_counter() - t0
+        return res
+
+
+def _cases(sizes):
+    """ Benchmark cases as {name: function of a DefiLlama instance}. Names
+    match the public method they time, optionally followed by a variant. """
+    tokens = token_keys(sizes['tokens'])
+    few = token_keys(min(sizes['tokens'], 50))
+    end = pd.Timestamp('today', tz='UTC').normalize() - pd.Timedelta(days=2)
+    start = end - pd.Timedelta(hours=sizes['hours'] - 24)
+    start, end = start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    days = min(sizes['days'], 365)
+    d_start = (pd.Timestamp(end) - pd.Timedelta(days=days - 1))\
+        .strftime('%Y-%m-%d')
+    batch = {f'{v}:{k}': [GENESIS + 3600 * i for i in range(24)]
+             for k, v in few.items()}
+    protocol = 'protocol-1'
+    protocols = [f'protocol-{i}' for i in range(min(sizes['protocols'], 100))]
+    rng = np.random.default_rng(42)
+    # events spread over one day
+    events = rng.integers(1640995200, 1640995200 + 86400, sizes['events'])
+    # ten times as many ledger events over the tokens in `few` and 30 days
+    keys = np.array([f'{v}:{k}' for k, v in few.items()], dtype=object)
+    ledger_coins = keys[rng.integers(0, len(keys), 10 * sizes['events'])]
+    ledger_times = rng.integers(1640995200, 1640995200 + 30 * 86400,
+                                10 * sizes['events'])
+
+    def sync(obj):
+        with tempfile.TemporaryDirectory() as path:
+            return obj.sync_tokens_hist_prices(
+                PriceStore(path), few, start, end)
+
+    def snapshot(obj):
+        # every view, from one download
+        snap = obj.get_protocol_snapshot(protocol)
+        return (snap.curr_tvl_by_chain(), snap.hist_tvl_by_chain(),
+                snap.tokens(), snap.tokens(usd=True))
+
+    def write_tvl(obj):
+        with tempfile.TemporaryDirectory() as path:
+            return obj.write_protocols_hist_tvl_by_chain(path, protocols)
+
+    def write(obj):
+        with tempfile.TemporaryDirectory() as path:
+            return obj.write_tokens_hist_prices(
+                f'{path}/prices.parquet', tokens, start, end)
+
+    return {
+        'get_protocol_curr_tvl': lambda o: o.get_protocol_curr_tvl(protocol),
+        'get_chains_curr_tvl': lambda o: o.get_chains_curr_tvl(),
+        'get_defi_hist_tvl': lambda o: o.get_defi_hist_tvl(),
+        'get_chain_hist_tvl': lambda o: o.get_chain_hist_tvl('Ethereum'),
+        'get_chains_hist_tvl': lambda o: o.get_chains_hist_tvl(),
+        'get_chains_hist_tvl[arrow]':
+            lambda o: o.get_chains_hist_tvl(as_arrow=True),
+        'get_protocols': lambda o: o.get_protocols(),
+        'get_protocol_registry': lambda o: o.get_protocol_registry(),
+        'get_protocols_fundamentals':
+            lambda o: o.get_protocols_fundamentals(),
+        'get_protocol': lambda o: o.get_protocol(protocol),
+        'get_protocol_curr_tvl_by_chain':
+            lambda o: o.get_protocol_curr_tvl_by_chain(protocol),
+        'get_protocol_hist_tvl_by_chain':
+            lambda o: o.get_protocol_hist_tvl_by_chain(protocol),
+        'get_protocol_snapshot': snapshot,
+        'iter_protocols_hist_tvl_by_chain':
+            lambda o: sum(len(df) for _, frames in
+                          o.iter_protocols_hist_tvl_by_chain(protocols)
+                          for df in frames.values()),
+        'write_protocols_hist_tvl_by_chain': write_tvl,
+        'get_tokens_curr_prices': lambda o: o.get_tokens_curr_prices(tokens),
+        'get_tokens_earliest_prices':
+            lambda o: o.get_tokens_earliest_prices(tokens),
+        'get_tokens_hist_snapshot_prices':
+            lambda o: o.get_tokens_hist_snapshot_prices(
+                tokens, '2022-01-01 00:00:00'),
+        'get_tokens_hist_batch_prices':
+            lambda o: o.get_tokens_hist_batch_prices(batch),
+        'get_daily_open_close':
+            lambda o: o.get_daily_open_close(tokens, d_start, end),
+        'get_daily_open_close[both]':
+            lambda o: o.get_daily_open_close(tokens, d_start, end, kind='both'),
+        'get_tokens_hist_prices':
+            lambda o: o.get_tokens_hist_prices(tokens, start, end),
+        'get_tokens_hist_prices[daily]':
+            lambda o: o.get_tokens_hist_prices(few, start, end, freq='daily'),
+        'get_tokens_hist_prices[4h]':
+            lambda o: o.get_tokens_hist_prices(few, start, end, freq='4h'),
+        'iter_tokens_hist_prices':
+            lambda o: sum(len(df) for df in o.iter_tokens_hist_prices(
+                tokens, start, end)),
+        'write_tokens_hist_prices': write,
+        'sync_tokens_hist_prices': sync,
+        'get_prices_at_regular_intervals':
+            lambda o: o.get_prices_at_regular_intervals(
+                few, '2023-01-01', span=500, period='1h'),
+        'get_prices_at_regular_intervals[3y of 4h]':
+            lambda o: o.get_prices_at_regular_intervals(
+                few, '2023-01-01', span=3 * 365 * 6, period='4h'),
+        'get_closest_block':
+            lambda o: o.get_closest_block('ethereum', '2022-01-01 00:00:00'),
+        'get_closest_blocks':
+            lambda o: o.get_closest_blocks('ethereum', events, tolerance=120),
+        'get_ledger_prices':
+            lambda o: o.get_ledger_prices(ledger_coins, ledger_times),
+        'get_stablecoins_circulating':
+            lambda o: o.get_stablecoins_circulating(),
+        'get_stablecoins_circulating_by_chain':
+            lambda o: o.get_stablecoins_circulating_by_chain(),
+        'get_stablecoin_hist_mcap': lambda o: o.get_stablecoin_hist_mcap(1),
+        'get_stablecoin_hist_mcap_on_a_chain':
+            lambda o: o.get_stablecoin_hist_mcap_on_a_chain(1, 'Ethereum'),
+        'get_stablecoins_curr_mcap_by_chain':
+            lambda o: o.get_stablecoins_curr_mcap_by_chain(),
+        'get_stablecoins_prices': lambda o: o.get_stablecoins_prices(),
+        'get_pools_yields': lambda o: o.get_pools_yields(),
+        'get_pool_hist_apy': lambda o: o.get_pool_hist_apy('pool-1'),
+        'get_dexes_volumes': lambda o: o.get_dexes_volumes(),
+        'get_dexes_volumes_this_chain':
+            lambda o: o.get_dexes_volumes_this_chain('Ethereum'),
+        'get_daily_volumes_this_dex':
+            lambda o: o.get_daily_volumes_this_dex('dex-1'),
+        'get_options_dexes_volumes': lambda o: o.get_options_dexes_volumes(),
+        'get_options_dexes_volumes_this_chain':
+            lambda o: o.get_options_dexes_volumes_this_chain('Ethereum'),
+        'get_daily_volumes_this_options_dex':
+            lambda o: o.get_daily_volumes_this_options_dex('dex-1'),
+        'get_fees': lambda o: o.get_fees(),
+        'get_fees_this_chain': lambda o: o.get_fees_this_chain('Ethereum'),
+        'get_daily_fees_this_protocol':
+            lambda o: o.get_daily_fees_this_protocol(protocol),
+        'get_bridges_volumes': lambda o: o.get_bridges_volumes(),
+        'get_bridge_volume': lambda o: o.get_bridge_volume(1),
+        'get_daily_volume_this_bridge':
+            lambda o: o.get_daily_volume_this_bridge(1),
+        'get_24h_token_volume_this_bridge':
+            lambda o: o.get_24h_token_volume_this_bridge(
+                1, 'Ethereum', '2022-12-01'),
+        'get_tx_this_bridge':
+            lambda o: o.get_tx_this_bridge(
+                1, 'Ethereum', '2022-12-01', '2022-12-02', few,
+                limit=sizes['bridge_txs']),
+    }
+
+
+def _parser_cases(sizes):
+    """ Micro-benchmarks of the JSON to data frame parsers, without any
+    requests. """
+    p = Payloads(sizes)
+    # thousands of tokens x hundreds of timestamps
+    coins = {f'{v}:{k}': list(range(GENESIS, GENESIS + 3600 * 200, 3600))
+             for k, v in token_keys(2 * sizes['tokens']).items()}
+    batch = json.loads(dumps(p.batch_historical(coins)))
+    # the same tokens, but only 10 distinct symbols, like USDC on many chains
+    shared = {'coins': {coin: dict(dd, symbol=f'S{i % 10}') for i, (coin, dd)
+                        in enumerate(batch['coins'].items())}}
+    overview = json.loads(dumps(p.overview()))
+    # hourly panel of 500 tokens over two years at full size
+    rng = np.random.default_rng(42)
+    hours = pd.date_range('2021-01-01', periods=2 * sizes['hours'], freq='h',
+                          tz='UTC')
+    panel = pd.DataFrame(rng.random((len(hours), sizes['tokens'] // 2 or 1)),
+                         index=hours)
+    return {
+        '_tidy_frame_hist_batch_prices':
+            lambda o: o._tidy_frame_hist_batch_prices(batch),
+        '_tidy_frame_hist_batch_prices[shared symbols]':
+            lambda o: o._tidy_frame_hist_batch_prices(shared),
+        '_tidy_frame_volume': lambda o: o._tidy_frame_volume(overview),
+        '_resample_prices[D]': lambda o: o._resample_prices(panel, 'D'),
+        '_resample_prices[W]': lambda o: o._resample_prices(panel, 'W'),
+    }
+
+
+def frame_nbytes(obj):
+    """ Memory used by the data frames (or Arrow tables) in a returned 
+    value, in bytes. """
+    if hasattr(obj, 'schema') and hasattr(obj, 'nbytes'): # pyarrow.Table
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        nbytes = obj.memory_usage(deep=True, index=True)
+        return int(nbytes.sum() if isinstance(obj, pd.DataFrame) else nbytes)
+    if isinstance(obj, dict):
+        return sum(frame_nbytes(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(frame_nbytes(v) for v in obj)
+    return 0
+
+
+def public_methods():
+    """ Names of the public request methods of DefiLlama. """
+    return sorted(name for name, func in inspect.getmembers(DefiLlama)
+                  if inspect.isfunction(func) and not name.startswith('_')
+                  and name not in ('priority', 'close'))
+
+
+def run(filter=None, repeat=1, scale=1., workers=1, compact=False):
+    """Run the benchmarks and return one row of timings per case.
+
+    Parameters
+    ----------
+    filter : string
+        Regular expression; only cases whose name matches are run.
+    repeat : int
+        Number of times to run each case. The fastest run is reported.
+    scale : float
+        Multiplies the payload sizes in payloads.SIZES.
+    workers : int
+        Maximum number of concurrent requests per method call.
+    compact : bool
+        Passed on to DefiLlama.
+
+    Returns
+    -------
+    data frame
+    """
+    sizes = scaled_sizes(scale)
+    server = StandInServer(sizes).start()
+    old = point_client_at(server.url)
+    cases = dict(_cases(sizes), **_parser_cases(sizes))
+    rows = []
+    try:
+        for name, case in cases.items():
+            if filter and not re.search(filter, name):
+                continue
+            best = None
+            for _ in range(repeat):
+                transport = TimedTransport(
+                    RequestsTransport(pool_maxsize=workers))
+                obj = TimedDefiLlama(max_workers=workers,
+                                     max_calls_per_sec=None,
+                                     transport=transport, compact=compact)
+                t0 = time.perf_counter()
+                res = case(obj)
+                wall = time.perf_counter() - t0
+                obj.close()
+                row = dict(case=name, wall=wall, network=transport.seconds,
+                           decode=obj.decode_seconds,
+                           MB=transport.nbytes / 2**20,
+                           frame_MB=frame_nbytes(res) / 2**20)
+                if best is None or wall < best['wall']:
+                    best = row
+            if workers == 1:
+                best['build'] = best['wall'] - best['network'] \
+                    - best['decode']
+            rows.append(best)
+    finally:
+        server.shutdown()
+        server.server_close()
+        for name, url in old.items():
+            setattr(dl, name, url)
+    df = pd.DataFrame(rows)
+    if len(df):
+        df = df.set_index('case').reindex(
+            columns=['wall', 'network', 'decode', 'build', 'MB', 'frame_MB'])
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--filter', help='regex of cases to run')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='runs per case, the fastest is reported')
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='multiplies the payload sizes')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='concurrent requests per method call')
+    parser.add_argument('--compact', action='store_true',
+                        help='return compact data frames')
+    args = parser.parse_args()
+    # keep the table readable
+    warnings.simplefilter('ignore', FutureWarning)
+
+    covered = {name.split('[')[0] for name in _cases(scaled_sizes(1))}
+    uncovered = set(public_methods()) - covered
+    if uncovered:
+        print('Public methods without a benchmark:', ', '.join(
+            sorted(uncovered)))
+
+    df = run(args.filter, args.repeat, args.scale, args.workers,
+             args.compact)
+    with pd.option_context('display.max_rows', None, 'display.width', None,
+                           'display.float_format', '{:.3f}'.format):
+        print(df)
+
+
+if __name__ == '__main__':
+    main()
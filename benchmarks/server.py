@@ -0,0 +1,162 @@
+"""
+Local HTTP stand-in for the DeFiLlama APIs, serving synthetic payloads.
+
+Each API family is served under its own path prefix, e.g. COINS requests go
+to http://127.0.0.1:<port>/coins/... Use `point_client_at()` to redirect the
+base URLs of defillama2 to a running server.
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import defillama2.defillama2 as dl
+from .payloads import Payloads, dumps
+
+PREFIXES = dict(TVL='/api', VOLUMES='/api', FEES='/api', COINS='/coins',
+                STABLECOINS='/stablecoins', YIELDS='/yields',
+                BRIDGES='/bridges', ABI_DECODER='/abi')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep connections alive
+    # headers and body are written separately, don't wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def handle_one_request(self):
+        # same as BaseHTTPRequestHandler's, without the 64 KiB limit on the
+        # request line, so that the server never rejects a large batch
+        self.raw_requestline = self.rfile.readline()
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if not self.parse_request():
+            return
+        getattr(self, 'do_' + self.command)()
+        self.wfile.flush()
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        try:
+            body = self.server.route(unquote(parts.path), query)
+            status = 200
+        except KeyError:
+            body, status = dumps({'message': 'not found'}), 404
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serves DeFiLlama-shaped payloads from `Payloads`. Static payloads are
+    generated once and then served from memory, so that timings measure the
+    client rather than the server.
+    """
+    daemon_threads = True
+    # many workers connect at once, a short accept queue would drop their
+    # connections and add a second each to retry them
+    request_queue_size = 128
+
+    def __init__(self, sizes=None, port=0):
+        super().__init__(('127.0.0.1', port), _Handler)
+        self.payloads = Payloads(sizes)
+        self._memo = dict()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def _static(self, key, make):
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = dumps(make())
+            return self._memo[key]
+
+    def route(self, path, q):
+        """ Encoded payload of a request path and query dict. Raises KeyError
+        for unknown endpoints. """
+        p = self.payloads
+        seg = path.strip('/').split('/')
+        api, rest = seg[0], seg[1:]
+        if api == 'api':
+            if rest[0] == 'tvl':
+                return dumps(123456789.0)
+            if rest[0] == 'chains':
+                return self._static('chains', p.chains)
+            if rest[0] == 'charts':
+                return self._static('charts', p.tvl_series)
+            if rest[0] == 'protocols':
+                return self._static('protocols', p.protocols)
+            if rest[0] == 'protocol':
+                return self._static('protocol', lambda: p.protocol(rest[1]))
+            if rest[0] in ('overview', 'summary') and len(rest) >= 2:
+                make = p.overview if rest[0] == 'overview' else p.summary
+                return self._static(rest[0], make)
+        elif api == 'coins':
+            if rest[0] == 'prices':
+                if rest[1] == 'historical':
+                    ts, coins = int(float(rest[2])), rest[3]
+                else:
+                    ts, coins = 1700000000, rest[2]
+                return dumps(p.prices(coins.split(','), ts))
+            if rest[0] == 'batchHistorical':
+                return dumps(p.batch_historical(json.loads(q['coins'])))
+            if rest[0] == 'chart':
+                period = dict(m=60, h=3600, d=86400, w=7 * 86400)
+                unit = q.get('period', '4h')
+                secs = int(unit[:-1] or 1) * period[unit[-1].lower()]
+                return dumps(p.chart(rest[1].split(','),
+                                     int(float(q['end'])),
+                                     int(q.get('span', 30)), secs))
+            if rest[0] == 'block':
+                return dumps(p.block(int(float(rest[2]))))
+        elif api == 'stablecoins':
+            if rest[0] == 'stablecoins':
+                return self._static('stablecoins', p.stablecoins)
+            if rest[0] == 'stablecoincharts':
+                return self._static('stablecoincharts', p.stablecoin_charts)
+            if rest[0] == 'stablecoinchains':
+                return self._static('stablecoinchains', p.stablecoin_chains)
+            if rest[0] == 'stablecoinprices':
+                return self._static('stablecoinprices', p.stablecoin_prices)
+        elif api == 'yields':
+            if rest[0] == 'pools':
+                return self._static('pools', p.pools)
+            if rest[0] == 'chart':
+                return self._static('pool_chart', p.pool_chart)
+        elif api == 'bridges':
+            if rest[0] == 'bridges':
+                return self._static('bridges', p.bridges)
+            if rest[0] == 'bridge':
+                return self._static('bridge', lambda: p.bridge(int(rest[1])))
+            if rest[0] == 'bridgevolume':
+                return self._static('bridgevolume', p.bridge_volume)
+            if rest[0] == 'bridgedaystats':
+                return self._static('bridgedaystats',
+                                    lambda: p.bridge_day_stats(rest[1]))
+            if rest[0] == 'transactions':
+                return dumps(p.transactions(q.get('limit', 200)))
+        raise KeyError(path)
+
+
+def point_client_at(url):
+    """ Redirect the base URLs of defillama2 to a stand-in server at `url`.
+    Returns the previous base URLs. """
+    old = dict()
+    for api_name, prefix in PREFIXES.items():
+        name = f'{api_name}_BASE_URL'
+        old[name] = getattr(dl, name)
+        setattr(dl, name, url + prefix)
+    return old
@@ -1 +1,9 @@
-from .defillama2 import DefiLlama
\ No newline at end of file
+from .defillama2 import DefiLlama
+from .aio import AsyncDefiLlama
+from .cache import ResponseCache, PriceCache, BlockIndex
+from .store import PriceStore
+from .snapshot import ProtocolSnapshot
+from .registry import ProtocolRegistry
+from .retry import RetryPolicy, ApiError, CircuitOpenError
+from .ratelimit import RequestScheduler, INTERACTIVE, BULK
+from .transport import Transport, RequestsTransport, RecordingTransport, ReplayTransport
@@ -0,0 +1,198 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+try:
+    import aiohttp
+    import yarl
+except ImportError: # optional dependency, see `pip install defillama2[async]`
+    aiohttp = None
+
+from .defillama2 import DefiLlama
+from .transport import Response, Transport
+
+
+class _BridgeTransport(Transport):
+    """
+    Transport that sends requests with an AsyncDefiLlama's aiohttp session on
+    its event loop. Must be called from a worker thread.
+    """
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def fetch(self, url, params=None):
+        future = asyncio.run_coroutine_threadsafe(
+            self._owner._arequest(url, params=params), self._owner._loop)
+        return future.result()
+
+
+class AsyncDefiLlama:
+    """
+    Asyncio client for DeFiLlama APIs. Every `get_*`, `sync_*` and `write_*`
+    method of DefiLlama is available here as a coroutine with the same 
+    arguments and return value, and every `iter_*` method as an async 
+    generator yielding the same items.
+
+    HTTP requests go through one aiohttp session (one connection pool) with at
+    most `max_concurrency` requests in flight. The session belongs to the 
+    event loop the client is first used on, so use one client per loop. Data cleaning runs in a thread
+    pool so that building large data frames doesn't block the event loop.
+
+    Use it as an async context manager, or call `close()` when done:
+
+        async with AsyncDefiLlama(max_concurrency=20) as llama:
+            protocols, chains = await asyncio.gather(
+                llama.get_protocols(), llama.get_chains_curr_tvl())
+    """
+
+    def __init__(self, max_concurrency=10, **kwargs):
+        """
+        Parameters
+        ----------
+        max_concurrency : int
+            Maximum number of HTTP requests in flight at the same time.
+        kwargs :
+            Passed on to DefiLlama. If `transport` is given, it is used instead
+            of aiohttp, e.g. ReplayTransport to run offline.
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncDefiLlama requires aiohttp. Install it "
+                              "with `pip install defillama2[async]`.")
+        self.max_concurrency = max_concurrency
+        kwargs.setdefault('max_workers', max_concurrency)
+        kwargs.setdefault('transport', _BridgeTransport(self))
+        self._sync = DefiLlama(**kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._loop = None
+        self._semaphore = None
+        self._client_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Close the aiohttp session and the thread pool."""
+        if self._client_session is not None:
+            await self._client_session.close()
+            self._client_session = None
+        self._executor.shutdown(wait=False)
+        self._sync.close(wait=False)
+
+    def _bind_loop(self):
+        """ Bind to the running event loop. A client whose aiohttp session
+        is open can't move to another loop, as the session can only be 
+        closed on the loop it was opened on. """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            if self._client_session is not None:
+                raise RuntimeError(
+                    'AsyncDefiLlama is bound to another event loop. Create '
+                    'one client per event loop, e.g. inside the coroutine '
+                    'passed to asyncio.run(), and close() it there.')
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client_session = None
+        return loop
+
+    async def _arequest(self, url, params=None):
+        """Send 'GET' request with aiohttp.
+
+        Parameters
+        ----------
+        url : string
+            Full URL, including base URL and endpoint.
+        params : dictionary or string
+            HTTP request parameters.
+
+        Returns
+        -------
+        Response
+        """
+        if self._client_session is None:
+            self._client_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=30))
+        if params:
+            if not isinstance(params, str):
+                params = urlencode(params)
+            url = url + ('&' if '?' in url else '?') + params
+        # quote the same way requests does, then stop aiohttp from re-quoting
+        url = yarl.URL(requests.utils.requote_uri(url), encoded=True)
+        async with self._semaphore:
+            try:
+                async with self._client_session.get(url) as resp:
+                    return Response(str(url), resp.status, resp.headers, 
+                                    await resp.read())
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                # so that DefiLlama's RetryPolicy retries it
+                raise ConnectionError(str(e)) from e
+
+    async def _call(self, name, *args, **kwargs):
+        """ Run DefiLlama method `name` in the thread pool. """
+        loop = self._bind_loop()
+        method = getattr(self._sync, name)
+        return await loop.run_in_executor(
+            self._executor, functools.partial(method, *args, **kwargs))
+
+    async def _iterate(self, name, *args, **kwargs):
+        """ Iterate DefiLlama generator method `name`, getting each item in 
+        the thread pool. The generator is closed when iteration stops early,
+        so it stops downloading. """
+        loop = self._bind_loop()
+        items = getattr(self._sync, name)(*args, **kwargs)
+        done = object()
+        # a step may still be running in its thread if the task is cancelled,
+        # and the generator can only be closed once it's done
+        lock = threading.Lock()
+
+        def step():
+            with lock:
+                return next(items, done)
+
+        def close():
+            with lock:
+                items.close()
+        try:
+            while True:
+                item = await loop.run_in_executor(self._executor, step)
+                if item is done:
+                    return
+                yield item
+        finally:
+            await loop.run_in_executor(self._executor, close)
+
+
+def _coroutine(name):
+    """ Make a coroutine method that mirrors DefiLlama method `name`. """
+    @functools.wraps(getattr(DefiLlama, name))
+    async def method(self, *args, **kwargs):
+        return await self._call(name, *args, **kwargs)
+    return method
+
+
+def _async_generator(name):
+    """ Make an async generator method that mirrors DefiLlama generator 
+    method `name`. """
+    @functools.wraps(getattr(DefiLlama, name))
+    async def method(self, *args, **kwargs):
+        items = self._iterate(name, *args, **kwargs)
+        try:
+            async for item in items:
+                yield item
+        finally:
+            await items.aclose()
+    return method
+
+
+for _name in dir(DefiLlama):
+    if _name.startswith(('get_', 'sync_', 'write_')):
+        setattr(AsyncDefiLlama, _name, _coroutine(_name))
+    elif _name.startswith('iter_'):
+        setattr(AsyncDefiLlama, _name, _async_generator(_name))
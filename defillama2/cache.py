@@ -0,0 +1,415 @@
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # not available on Windows, where we skip file locking
+    fcntl = None
+
+# seconds a cached response stays fresh, by API family. COINS responses are
+# left out, as most are unique historical prices, kept by PriceCache instead.
+DEFAULT_TTLS = {'TVL': 600, 'STABLECOINS': 600, 'YIELDS': 600,
+                'VOLUMES': 600, 'FEES': 600, 'BRIDGES': 600,
+                'ABI_DECODER': 86400}
+# number of lock files of a ResponseCache, each shared by the keys hashed to it
+N_LOCKS = 64
+
+# seconds after which a historical price point no longer changes. DeFiLlama 
+# publishes prices a few hours late.
+IMMUTABLE_AFTER = 4 * 3600
+# seconds after which DeFiLlama is known to have no price for a timestamp it
+# hasn't published a price for
+NO_PRICE_AFTER = 24 * 3600
+
+_MISSING = object()
+
+
+def request_key(api_name, endpoint, params=None):
+    """ String identifying a request by API name, endpoint and parameters. """
+    if params and not isinstance(params, str):
+        params = urlencode(sorted(params.items()))
+    return f'{api_name} {endpoint}?{params or ""}'
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of JSON responses, safe to share between processes on
+    one host. Responses are stored in a SQLite database under `path` and keyed
+    by API name, endpoint and request parameters.
+
+    When a response is missing or stale, the process that fetches it holds a
+    file lock on its key, so other processes asking for the same response wait
+    and then read the fresh copy instead of downloading it again. Keys share
+    N_LOCKS lock files. Expired responses of an API are deleted whenever a 
+    response of that API is written, or by prune().
+    """
+
+    def __init__(self, path, ttls=None):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory holding the cache. Created if it doesn't exist.
+        ttls : dictionary
+            Seconds a response stays fresh, by API name ('TVL', 'COINS',
+            'YIELDS', ...). Overrides DEFAULT_TTLS. Use 0 or None to not cache
+            an API. APIs missing from both aren't cached.
+        """
+        self.path = os.path.expanduser(path)
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        os.makedirs(os.path.join(self.path, 'locks'), exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                         'key TEXT PRIMARY KEY, api_name TEXT, '
+                         'created REAL, body TEXT)')
+            conn.execute('CREATE INDEX IF NOT EXISTS responses_created '
+                         'ON responses (api_name, created)')
+
+    def _connect(self):
+        """ One connection per thread, since sqlite3 connections can't be
+        shared between threads. """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.path, 'responses.sqlite'), timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def _lock(self, key):
+        """ Hold an exclusive file lock on `key` across processes. """
+        if fcntl is None:
+            yield
+            return
+        digest = hashlib.sha256(key.encode()).digest()
+        name = f'{int.from_bytes(digest[:4], "big") % N_LOCKS}.lock'
+        with open(os.path.join(self.path, 'locks', name), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, key, ttl):
+        row = self._connect().execute(
+            'SELECT created, body FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+        if row is None or row[0] + ttl < time.time():
+            return _MISSING
+        return json.loads(row[1])
+
+    def _write(self, key, api_name, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO responses VALUES (?,?,?,?)',
+                         (key, api_name, now, json.dumps(value)))
+            conn.execute('DELETE FROM responses '
+                         'WHERE api_name = ? AND created < ?', 
+                         (api_name, now - ttl))
+
+    def fetch(self, api_name, endpoint, params, fetch):
+        """Return the cached response if it's fresh, otherwise call `fetch`
+        and cache what it returns.
+
+        Parameters
+        ----------
+        api_name : string
+            'TVL', 'COINS', 'STABLECOINS', 'YIELDS', ...
+        endpoint : string
+            Endpoint to be added to base URL.
+        params : dictionary or string
+            HTTP request parameters.
+        fetch : callable
+            Function of no arguments that downloads the response.
+
+        Returns
+        -------
+        JSON response
+        """
+        ttl = self.ttls.get(api_name)
+        if not ttl:
+            return fetch()
+        key = request_key(api_name, endpoint, params)
+        value = self._read(key, ttl)
+        if value is not _MISSING:
+            return value
+        with self._lock(key):
+            # another process may have fetched it while we waited for the lock
+            value = self._read(key, ttl)
+            if value is _MISSING:
+                value = fetch()
+                self._write(key, api_name, value, ttl)
+        return value
+
+    def clear(self, api_name=None):
+        """Delete cached responses.
+
+        Parameters
+        ----------
+        api_name : string
+            Only delete responses of this API. Deletes everything if None.
+        """
+        with self._connect() as conn:
+            if api_name is None:
+                conn.execute('DELETE FROM responses')
+            else:
+                conn.execute('DELETE FROM responses WHERE api_name = ?',
+                             (api_name,))
+
+    def prune(self):
+        """Delete expired responses, including every response of an API 
+        that isn't cached anymore."""
+        now = time.time()
+        with self._connect() as conn:
+            api_names = [row[0] for row in conn.execute(
+                'SELECT DISTINCT api_name FROM responses')]
+            for api_name in api_names:
+                conn.execute('DELETE FROM responses '
+                             'WHERE api_name = ? AND created < ?',
+                             (api_name, now - (self.ttls.get(api_name) or 0)))
+
+
+# record of a (coin, timestamp) pair DeFiLlama has no price for
+NO_PRICE = dict(timestamp=None, price=None, symbol=None)
+
+
+class PriceCache:
+    """
+    Never-expiring cache of historical token prices, keyed by chain:address
+    and the unix timestamp the price was requested at. Only prices requested
+    for timestamps at least IMMUTABLE_AFTER seconds in the past are stored,
+    since those don't change anymore. Pairs DeFiLlama has no price for, e.g.
+    before a token was listed, are stored with a NULL price (see NO_PRICE),
+    so that they aren't requested again, but only once they are at least
+    NO_PRICE_AFTER seconds in the past, as a missing price may just not be 
+    published yet.
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory holding the cache, which can be shared by several
+            processes. Created if it doesn't exist. Prices are kept in memory
+            only if None.
+        """
+        if path is None:
+            db = ':memory:'
+        else:
+            path = os.path.expanduser(path)
+            os.makedirs(path, exist_ok=True)
+            db = os.path.join(path, 'prices.sqlite')
+        self._conn = sqlite3.connect(db, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS prices ('
+                'coin TEXT, ts INTEGER, timestamp INTEGER, price REAL, '
+                'confidence REAL, symbol TEXT, decimals INTEGER, '
+                'PRIMARY KEY (coin, ts))')
+
+    def get(self, coin_timestamps):
+        """Look up cached prices.
+
+        Parameters
+        ----------
+        coin_timestamps : dictionary
+            Each key is a chain:token_address; each value is a list of unix
+            timestamps in seconds.
+
+        Returns
+        -------
+        dictionary of dictionaries: {coin: {requested timestamp: record}},
+        where each record is a dict with keys `timestamp`, `price`,
+        `confidence`, `symbol` and `decimals`. Only held pairs are included;
+        the price of a pair held as having no price is None.
+        """
+        res = dict()
+        # pairs without a price stored by earlier versions, which kept them
+        # sooner, are requested again until they are old enough
+        cutoff = time.time() - NO_PRICE_AFTER
+        with self._lock:
+            for coin, tss in coin_timestamps.items():
+                tss = set(int(ts) for ts in tss)
+                if not tss:
+                    continue
+                rows = self._conn.execute(
+                    'SELECT ts, timestamp, price, confidence, symbol, decimals '
+                    'FROM prices WHERE coin = ? AND ts BETWEEN ? AND ?',
+                    (coin, min(tss), max(tss))).fetchall()
+                held = {row[0]: dict(zip(
+                            ['timestamp', 'price', 'confidence', 'symbol',
+                             'decimals'], row[1:]))
+                        for row in rows if row[0] in tss
+                        and (row[2] is not None or row[0] <= cutoff)}
+                if held:
+                    res[coin] = held
+        return res
+
+    def put(self, coin, records):
+        """Store prices of a coin, skipping timestamps that are too recent:
+        less than IMMUTABLE_AFTER seconds old for prices, and less than 
+        NO_PRICE_AFTER seconds old for pairs without a price.
+
+        Parameters
+        ----------
+        coin : string
+            chain:token_address
+        records : dictionary
+            Each key is the requested unix timestamp; each value is a dict
+            with keys `timestamp`, `price` and `symbol`, and optionally
+            `confidence` and `decimals`. Use NO_PRICE for timestamps 
+            DeFiLlama has no price for.
+        """
+        now = time.time()
+        rows = [(coin, int(ts), rec['timestamp'], rec['price'],
+                 rec.get('confidence'), rec['symbol'], rec.get('decimals'))
+                for ts, rec in records.items() 
+                if ts <= now - (IMMUTABLE_AFTER if rec['price'] is not None 
+                                else NO_PRICE_AFTER)]
+        if rows:
+            with self._lock, self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO prices VALUES (?,?,?,?,?,?,?)',
+                    rows)
+
+
+def interpolate_blocks(anchor_timestamps, anchor_heights, timestamps, 
+                       tolerance):
+    """Resolve timestamps to block heights by interpolating between anchors.
+
+    Parameters
+    ----------
+    anchor_timestamps : array of int
+        Unix timestamps of known blocks in seconds, sorted and distinct.
+    anchor_heights : array of int
+        Heights of the known blocks.
+    timestamps : array of int
+        Unix timestamps to resolve in seconds.
+    tolerance : int
+        Maximum seconds between the two anchors around a timestamp.
+
+    Returns
+    -------
+    array of int, the closest block height to each timestamp, or -1 where
+    the anchors can't resolve it
+    """
+    t, h = anchor_timestamps, anchor_heights
+    ts = np.asarray(timestamps, dtype=np.int64)
+    res = np.full(len(ts), -1, dtype=np.int64)
+    if not len(t):
+        return res
+    # t[lo] <= ts < t[hi]
+    i = np.searchsorted(t, ts, side='right')
+    lo, hi = np.clip(i - 1, 0, len(t) - 1), np.clip(i, 0, len(t) - 1)
+    width = t[hi] - t[lo]
+    inside = (i > 0) & (i < len(t)) & (width <= tolerance)
+    frac = (ts - t[lo]) / np.where(width > 0, width, 1)
+    est = np.rint(h[lo] + frac * (h[hi] - h[lo])).astype(np.int64)
+    res[inside] = est[inside]
+    exact = t[lo] == ts
+    res[exact] = h[lo][exact]
+    return res
+
+
+class BlockIndex:
+    """
+    Never-expiring index of block heights by timestamp, kept as a sorted array
+    of (timestamp, height) anchors per chain. A timestamp that falls between
+    two anchors at most `tolerance` seconds apart is resolved by interpolating
+    between them, without any request. Only blocks at least IMMUTABLE_AFTER
+    seconds old are stored.
+    """
+
+    def __init__(self, path=None):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory holding the index, which can be shared by several
+            processes. Created if it doesn't exist. Anchors are kept in memory
+            only if None.
+        """
+        if path is None:
+            db = ':memory:'
+        else:
+            path = os.path.expanduser(path)
+            os.makedirs(path, exist_ok=True)
+            db = os.path.join(path, 'blocks.sqlite')
+        self._conn = sqlite3.connect(db, timeout=60, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._anchors = dict() # chain -> (timestamps, heights), sorted
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS blocks ('
+                'chain TEXT, timestamp INTEGER, height INTEGER, '
+                'PRIMARY KEY (chain, timestamp))')
+
+    def _load(self, chain):
+        """ Anchors of a chain, read from the database on first use. Must be
+        called with the lock held. """
+        if chain not in self._anchors:
+            rows = self._conn.execute(
+                'SELECT timestamp, height FROM blocks WHERE chain = ? '
+                'ORDER BY timestamp', (chain,)).fetchall()
+            arr = np.array(rows, dtype=np.int64).reshape(-1, 2)
+            self._anchors[chain] = (arr[:, 0], arr[:, 1])
+        return self._anchors[chain]
+
+    def lookup(self, chain, timestamps, tolerance):
+        """Resolve timestamps from the held anchors.
+
+        Parameters
+        ----------
+        chain : string
+            Name of the chain.
+        timestamps : array of int
+            Unix timestamps in seconds.
+        tolerance : int
+            Maximum seconds between the two anchors around a timestamp.
+
+        Returns
+        -------
+        array of int, the closest block height to each timestamp, or -1 where
+        the anchors can't resolve it
+        """
+        with self._lock:
+            t, h = self._load(chain)
+        return interpolate_blocks(t, h, timestamps, tolerance)
+
+    def add(self, chain, timestamps, heights):
+        """Store blocks of a chain, skipping those that are too recent.
+
+        Parameters
+        ----------
+        chain : string
+            Name of the chain.
+        timestamps : array of int
+            Unix timestamps of the blocks in seconds.
+        heights : array of int
+            Block heights.
+        """
+        ts = np.asarray(timestamps, dtype=np.int64)
+        hs = np.asarray(heights, dtype=np.int64)
+        keep = ts <= time.time() - IMMUTABLE_AFTER
+        ts, hs = ts[keep], hs[keep]
+        if not len(ts):
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO blocks VALUES (?,?,?)',
+                [(chain, int(t), int(h)) for t, h in zip(ts, hs)])
+            t, h = self._load(chain)
+            t, idx = np.unique(np.concatenate([ts, t]), return_index=True)
+            self._anchors[chain] = (t, np.concatenate([hs, h])[idx])
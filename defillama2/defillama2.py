@@ -1,23 +1,131 @@
-import requests
 import pandas as pd
 import numpy as np
-import time
+import collections
+import contextlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, quote
 
+from .cache import NO_PRICE, BlockIndex, interpolate_blocks, request_key
+from .ratelimit import BULK, INTERACTIVE, RequestScheduler
+from .retry import ApiError, RetryPolicy
+from .singleflight import SingleFlight
+from .registry import ProtocolRegistry
+from .snapshot import ProtocolSnapshot
+from .transport import RequestsTransport
+
 TVL_BASE_URL = VOLUMES_BASE_URL = FEES_BASE_URL = "https://api.llama.fi"
 COINS_BASE_URL = "https://coins.llama.fi"
 STABLECOINS_BASE_URL = "https://stablecoins.llama.fi"
 YIELDS_BASE_URL = "https://yields.llama.fi"
 ABI_DECODER_BASE_URL = "https://abi-decoder.llama.fi"
 BRIDGES_BASE_URL = "https://bridges.llama.fi"
+# longest URL sent when a list of coins is part of the URL, longer lists are
+# split into several requests. Cloudflare, in front of the APIs, rejects URLs 
+# over 16 KB.
+MAX_URL_LENGTH = 8000
+# most (coin, timestamp) pairs asked for in one /batchHistorical request
+MAX_BATCH_POINTS = 1000
+# most price points per coin asked for in one /chart request
+MAX_CHART_SPAN = 500
+# most prices held in memory by sync_tokens_hist_prices() before they're 
+# written to the store
+SYNC_FLUSH_POINTS = 500000
 
 class DefiLlama:
     """ 
     Implements methods for calling DeFiLlama APIs and cleaning returned data. 
     """
 
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, max_workers=8, max_calls_per_sec=10, cache=None,
+                 price_cache=None, retry=None, scheduler=None, transport=None,
+                 block_index=None, compact=False):
+        """
+        Parameters
+        ----------
+        max_workers : int
+            Maximum number of requests sent concurrently by methods that need
+            many requests, such as get_tokens_hist_prices(). Use 1 to send them
+            one after another.
+        max_calls_per_sec : float
+            Maximum average number of requests per second to each host. Use 
+            None to turn off rate limiting. Ignored if `scheduler` is given.
+        cache : ResponseCache
+            Optional disk cache of responses, e.g. ResponseCache('~/.defillama'). 
+            Can be shared by several processes on the same host.
+        price_cache : PriceCache
+            Optional never-expiring cache of historical prices, e.g. 
+            PriceCache('~/.defillama'). Historical price methods only request
+            (token, timestamp) pairs it doesn't hold yet.
+        retry : RetryPolicy
+            How to retry failed requests and when to stop sending requests to 
+            a failing host. Defaults to RetryPolicy(). Use 
+            RetryPolicy(max_retries=0) to not retry.
+        scheduler : RequestScheduler
+            Decides when each request may be sent, with a rate limit per host
+            and interactive requests served before bulk downloads. Share one
+            scheduler between instances to enforce a quota across them.
+            Defaults to RequestScheduler(max_calls_per_sec).
+        transport : Transport
+            Sends the HTTP requests. Defaults to RequestsTransport(), which 
+            reuses connections. Use RecordingTransport to save raw responses 
+            and ReplayTransport to serve them from disk without network access.
+        block_index : BlockIndex
+            Index of block heights by timestamp used by get_closest_blocks(), 
+            e.g. BlockIndex('~/.defillama') to keep it across runs. Defaults 
+            to an in-memory index.
+        compact : bool
+            If True, data frames returned by get_* and iter_* methods use less 
+            memory: repeated strings, such as symbol, chain, token_address, 
+            category or project, become categoricals, and prices become 
+            float32, which keeps about 7 significant digits. Other numbers, 
+            such as TVL, volumes or unix timestamps, are kept as they are.
+        """
+        if transport is None:
+            transport = RequestsTransport(pool_maxsize=max_workers)
+        self.transport = transport
+        # kept for backward compatibility, None for other transports
+        self.session = getattr(transport, 'session', None)
+        self.max_workers = max_workers
+        if scheduler is None and max_calls_per_sec:
+            scheduler = RequestScheduler(max_calls_per_sec)
+        self.scheduler = scheduler
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='defillama2')
+        self._local = threading.local()
+        self.cache = cache
+        self.price_cache = price_cache
+        self.retry = retry if retry is not None else RetryPolicy()
+        self._in_flight = SingleFlight()
+        self.block_index = block_index if block_index is not None \
+            else BlockIndex()
+        self.compact = compact
+        self._registry = None
+        self._registry_lock = threading.Lock()
+        self._hist_tvl_series = dict()
+        self._hist_tvl_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self, wait=True):
+        """Shut down the thread pool and close the transport, releasing its 
+        connections. The instance can't send requests afterwards. Called on 
+        leaving a `with DefiLlama() as obj:` block.
+
+        Parameters
+        ----------
+        wait : bool
+            Whether to wait for requests still running in the thread pool.
+        """
+        self._executor.shutdown(wait=wait)
+        self.transport.close()
 
     def _get(self, api_name, endpoint, params=None):
         """Send 'GET' request.
@@ -34,25 +142,230 @@ class DefiLlama:
         
         Returns
         -------
-        JSON response
+        JSON response, which may be shared with concurrent callers of the same
+        request and must not be modified
         """
+        base_url = self._base_url(api_name)
+        url = base_url + endpoint
+
+        priority = getattr(self._local, 'priority', None)
+
+        def send():
+            if self.scheduler is not None:
+                self.scheduler.acquire(
+                    base_url, INTERACTIVE if priority is None else priority)
+            return self._request(url, params=params)
+
+        def fetch():
+            return self.retry.call(send, host=base_url)
+
+        def fetch_or_load():
+            if self.cache is not None:
+                return self.cache.fetch(api_name, endpoint, params, fetch)
+            return fetch()
+        # callers asking for a response that is already being downloaded wait
+        # for it and share it, instead of downloading it again
+        return self._in_flight.do(request_key(api_name, endpoint, params), 
+                                  fetch_or_load)
+
+    def _base_url(self, api_name):
+        """ Base URL of an API. """
         if api_name == 'TVL':
-            url = TVL_BASE_URL + endpoint
+            return TVL_BASE_URL
         elif api_name == 'COINS':
-            url = COINS_BASE_URL + endpoint  
+            return COINS_BASE_URL
         elif api_name == 'STABLECOINS':    
-            url = STABLECOINS_BASE_URL + endpoint
+            return STABLECOINS_BASE_URL
         elif api_name == 'YIELDS':
-            url = YIELDS_BASE_URL + endpoint 
+            return YIELDS_BASE_URL
         elif api_name == 'VOLUMES':
-            url = VOLUMES_BASE_URL + endpoint
+            return VOLUMES_BASE_URL
         elif api_name == 'FEES':
-            url = FEES_BASE_URL + endpoint
+            return FEES_BASE_URL
         elif api_name == 'BRIDGES':
-            url = BRIDGES_BASE_URL + endpoint
-        else: 
-            url = ABI_DECODER_BASE_URL + endpoint
-        return self.session.request('GET', url,params=params,timeout=30).json()
+            return BRIDGES_BASE_URL
+        else:
+            return ABI_DECODER_BASE_URL
+
+    def _request(self, url, params=None):
+        """Send 'GET' request to a full URL through the transport and decode 
+        the JSON response.
+
+        Parameters
+        ----------
+        url : string
+            Full URL, including base URL and endpoint.
+        params : dictionary or string
+            HTTP request parameters.
+
+        Returns
+        -------
+        JSON response
+
+        Raises
+        ------
+        ApiError if the response has an HTTP error status.
+        """
+        resp = self.transport.fetch(url, params=params)
+        if resp.status >= 400:
+            raise ApiError(resp.url, resp.status, resp.headers.get('Retry-After'))
+        return self._decode(resp.content)
+
+    def _decode(self, content):
+        """ Decode raw JSON response body. """
+        return json.loads(content)
+
+    def _map(self, func, items):
+        """Apply `func` to every item using the thread pool.
+
+        Calls made from inside a pool thread run serially, so nested calls
+        can't deadlock the pool.
+
+        Parameters
+        ----------
+        func : callable
+            Function of one argument.
+        items : iterable
+            Arguments to call `func` with.
+
+        Returns
+        -------
+        list of results, in the same order as `items`
+        """
+        items = list(items)
+        if len(items) <= 1 or self.max_workers <= 1 \
+                or getattr(self._local, 'in_pool', False):
+            return [func(item) for item in items]
+        # pool threads inherit the caller's request priority
+        run = self._in_pool(func, getattr(self._local, 'priority', None))
+        return list(self._executor.map(run, items))
+
+    def _imap(self, func, items, priority=None):
+        """Like _map(), but yield the results one at a time, in order, while
+        keeping at most `max_workers` calls running ahead. Memory is bounded 
+        by the results not consumed yet, however many items there are.
+
+        Parameters
+        ----------
+        func : callable
+            Function of one argument.
+        items : iterable
+            Arguments to call `func` with.
+        priority : int
+            Request priority of the calls, INTERACTIVE or BULK. Defaults to 
+            the priority chosen by the caller when iteration starts.
+
+        Yields
+        ------
+        results, in the same order as `items`. Calls not started yet are 
+        cancelled if the generator is closed early.
+        """
+        if priority is None:
+            priority = getattr(self._local, 'priority', None)
+        if self.max_workers <= 1 or getattr(self._local, 'in_pool', False):
+            for item in items:
+                # don't hold the priority across yields, where the caller runs
+                with self.priority(priority):
+                    res = func(item)
+                yield res
+            return
+        run = self._in_pool(func, priority)
+        pending = collections.deque()
+        try:
+            for item in items:
+                pending.append(self._executor.submit(run, item))
+                if len(pending) >= self.max_workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _in_pool(self, func, priority):
+        """ Wrap `func` to run in a pool thread with the given priority. """
+        def run(item):
+            self._local.in_pool = True
+            self._local.priority = priority
+            try:
+                return func(item)
+            finally:
+                self._local.in_pool = False
+                self._local.priority = None
+        return run
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """Send the requests made in this block, by the current thread, with 
+        the given priority. For example,
+
+            with obj.priority(BULK):
+                obj.get_pools_yields()
+
+        Parameters
+        ----------
+        priority : int
+            INTERACTIVE or BULK. Requests are INTERACTIVE by default, except 
+            those of methods that download many chunks, which are BULK.
+        """
+        old = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = old
+
+    def _bulk(self):
+        """ Context that marks requests as BULK unless the caller has chosen a
+        priority already. """
+        chosen = getattr(self._local, 'priority', None)
+        return self.priority(BULK if chosen is None else chosen)
+
+    def _compact(self, obj, prices=()):
+        """Shrink a data frame returned to the user when `compact` is on.
+
+        Columns of strings with repeated values become categoricals and 
+        price columns become float32. Other columns are kept.
+
+        Parameters
+        ----------
+        obj : data frame, or dictionary or tuple of them
+            Frames in dictionaries and tuples are compacted too; anything else
+            is returned unchanged.
+        prices : list or bool
+            Labels of the columns holding prices, or True if all columns do.
+
+        Returns
+        -------
+        same type as `obj`
+        """
+        if not self.compact:
+            return obj
+        if isinstance(obj, dict):
+            return {k: self._compact(v, prices) for k, v in obj.items()}
+        if isinstance(obj, tuple):
+            return tuple(self._compact(v, prices) for v in obj)
+        if not isinstance(obj, pd.DataFrame):
+            return obj
+        cols, changed = [], False
+        for label, col in obj.items():
+            if col.dtype == np.float64 and (prices is True or label in prices):
+                col = col.astype(np.float32)
+            elif col.dtype == object and len(col) > 1 \
+                    and pd.api.types.infer_dtype(col, skipna=True) == 'string' \
+                    and col.nunique() <= len(col) // 2:
+                col = col.astype('category')
+            else:
+                cols.append(col)
+                continue
+            cols.append(col)
+            changed = True
+        if not changed:
+            return obj
+        # rebuild by position, as column labels can repeat
+        df = pd.concat(cols, axis=1, ignore_index=True)
+        df.columns = obj.columns
+        return df
 
     # --- TVL --- #
     
@@ -95,35 +408,164 @@ class DefiLlama:
         resp = self._get('TVL', f'/chains/')
         df = pd.DataFrame(resp).loc[:, ['name', 'tokenSymbol', 'tvl']]
         df = df.rename(columns={'name':'chain', 'tokenSymbol':'token'})
-        return df.reset_index(drop=True)
+        return self._compact(df.reset_index(drop=True))
+
+    def _hist_tvl(self, endpoint, incremental):
+        """Get a historical TVL series, optionally appending only the dates 
+        past the ones held from earlier calls.
+
+        Parameters
+        ----------
+        endpoint : string
+            '/charts' or '/charts/{chain}'.
+        incremental : bool
+            Whether to keep the series and parse only new dates next time.
 
-    def get_defi_hist_tvl(self):
+        Returns 
+        -------
+        data frame
+        """
+        resp = self._get('TVL', endpoint)
+        if not incremental:
+            return self._tidy_frame_tvl(pd.DataFrame(resp))
+        with self._hist_tvl_lock:
+            held = self._hist_tvl_series.get(endpoint)
+            if held is None or not held['n']:
+                new = self._tidy_frame_tvl(pd.DataFrame(resp))
+                held = dict(n=0, columns=new.columns, 
+                            dates=np.empty(0, dtype=np.int64),
+                            values=np.empty((0, new.shape[1])))
+            else:
+                # points are in date order, so the new ones are at the end. 
+                # The latest held point is parsed again, as DeFiLlama updates
+                # today's TVL until the day is over.
+                last = held['dates'][held['n'] - 1] // 10**9
+                i = len(resp)
+                while i > 0 and int(resp[i-1]['date']) >= last:
+                    i -= 1
+                if i == len(resp):
+                    return held['frame']
+                new = self._tidy_frame_tvl(pd.DataFrame(resp[i:]))\
+                    .reindex(columns=held['columns'])
+            # rows are kept in buffers that grow geometrically, so a poll 
+            # only writes the new rows, overwriting held rows of the same 
+            # dates, and the returned frame is a view of the buffers
+            start = int(np.searchsorted(held['dates'][:held['n']], 
+                                        new.index.asi8[0])) if len(new) else 0
+            n = start + len(new)
+            if n > len(held['dates']):
+                size = max(n, 2 * len(held['dates']))
+                dates = np.empty(size, dtype=np.int64)
+                values = np.empty((size, len(held['columns'])))
+                dates[:start] = held['dates'][:start]
+                values[:start] = held['values'][:start]
+                held['dates'], held['values'] = dates, values
+            held['dates'][start:n] = new.index.asi8
+            held['values'][start:n] = new.to_numpy(dtype=float)
+            held['n'] = n
+            index = pd.DatetimeIndex(held['dates'][:n], copy=False, 
+                                     dtype='datetime64[ns, UTC]', name='date')
+            held['frame'] = pd.DataFrame(held['values'][:n], index=index, 
+                                         columns=held['columns'], copy=False)
+            self._hist_tvl_series[endpoint] = held
+        return held['frame']
+
+    def get_defi_hist_tvl(self, incremental=False):
         """Get historical TVL of DeFi on all chains.
 
+        Parameters
+        ----------
+        incremental : bool
+            If True, keep the series and, on later calls with 
+            incremental=True, parse only the dates past the latest one held 
+            and append them, so that polling costs time proportional to the 
+            new dates. The returned frame shares memory with the kept 
+            series, whose latest date later calls may update, so copy it 
+            before modifying it or to keep it as it is.
+
         Returns 
         -------
         data frame
         """
-        resp = self._get('TVL', '/charts')
-        df = pd.DataFrame(resp)
-        return self._tidy_frame_tvl(df)
+        return self._compact(self._hist_tvl('/charts', incremental))
 
-    def get_chain_hist_tvl(self, chain):
+    def get_chain_hist_tvl(self, chain, incremental=False):
         """Get historical TVL of a chain.
 
         Parameters
         ----------
         chain : string
             Chain name.
+        incremental : bool
+            If True, keep the chain's series and, on later calls with 
+            incremental=True, parse only the dates past the latest one held 
+            and append them, so that polling costs time proportional to the 
+            new dates. The returned frame shares memory with the kept 
+            series, whose latest date later calls may update, so copy it 
+            before modifying it or to keep it as it is.
         
         Returns 
         -------
         data frame
         """
-        resp = self._get('TVL', f'/charts/{chain}')
-        df = pd.DataFrame(resp)
-        return self._tidy_frame_tvl(df)
-        
+        return self._compact(self._hist_tvl(f'/charts/{chain}', incremental))
+
+    def get_chains_hist_tvl(self, chains=None, as_arrow=False):
+        """Get historical TVL of many chains as one panel aligned on date.
+        Chains are downloaded concurrently and written straight into one
+        matrix, without building a data frame per chain.
+
+        Parameters
+        ----------
+        chains : list
+            Chain names. Defaults to all chains listed by
+            get_chains_curr_tvl().
+        as_arrow : bool
+            If True, return a pyarrow Table with a `date` column and one
+            column per chain instead of a data frame. Requires pyarrow
+            (`pip install defillama2[parquet]`).
+
+        Returns
+        -------
+        data frame where each row is a date and each column is a chain, with
+        missing values on dates a chain has no TVL for
+        """
+        if as_arrow:
+            try:
+                import pyarrow as pa
+            except ImportError: # optional dependency
+                raise ImportError("get_chains_hist_tvl(as_arrow=True) "
+                                  "requires pyarrow. Install it with `pip "
+                                  "install defillama2[parquet]`.") from None
+        if chains is None:
+            chains = self.get_chains_curr_tvl()['chain'].tolist()
+
+        def fetch(chain):
+            resp = self._get('TVL', f'/charts/{chain}')
+            # dates are unix seconds, sometimes as strings
+            dates = np.fromiter((int(pt['date']) for pt in resp), 
+                                dtype=np.int64, count=len(resp))
+            tvls = np.fromiter((pt['totalLiquidityUSD'] for pt in resp),
+                               dtype=float, count=len(resp))
+            return dates, tvls
+        with self._bulk():
+            series = self._map(fetch, chains)
+
+        # union of all dates, then each chain's points go to their rows
+        dates = np.unique(np.concatenate(
+            [d for d, _ in series] or [np.array([], dtype=np.int64)]))
+        panel = np.full((len(dates), len(chains)), np.nan)
+        for j, (d, tvls) in enumerate(series):
+            panel[np.searchsorted(dates, d), j] = tvls
+        index = pd.to_datetime(dates, unit='s', utc=True)
+        if as_arrow:
+            return pa.Table.from_arrays(
+                [pa.array(index)] + [pa.array(panel[:, j], from_pandas=True)
+                                     for j in range(len(chains))],
+                names=['date'] + list(chains))
+        return self._compact(pd.DataFrame(
+            panel, index=pd.Index(index, name='date'), columns=list(chains)))
+
     def get_protocols(self):
         """Get detailed information on all protocols. 
         
@@ -131,7 +573,27 @@ class DefiLlama:
         -------
         data frame
         """
-        return pd.DataFrame(self._get('TVL', '/protocols'))
+        return self._compact(pd.DataFrame(self._get('TVL', '/protocols')))
+
+    def get_protocol_registry(self, refresh=False):
+        """Get indexes of all protocols, to look them up by slug, name, 
+        parent, category or chain, and their TVL rolled up to parent 
+        protocols. Built from get_protocols() on the first call and kept.
+        
+        Parameters
+        ----------
+        refresh : bool
+            If True, download the protocols again and rebuild the indexes.
+        
+        Returns 
+        -------
+        ProtocolRegistry
+        """
+        with self._registry_lock:
+            if self._registry is None or refresh:
+                self._registry = ProtocolRegistry(
+                    pd.DataFrame(self._get('TVL', '/protocols')))
+            return self._registry
 
     def get_protocols_fundamentals(self):
         """Get current TVL, MCap, FDV, 1d and 7d TVL % change on all protocols.
@@ -150,7 +612,7 @@ class DefiLlama:
                 'tvl', 'change_1d', 'change_7d', 
                 'mcap', 'forkedFrom']
         df = df.loc[:, cols].rename(columns={'forkedFrom':'forked_from'})
-        return df
+        return self._compact(df)
 
     def get_protocol(self, protocol):
         """Get detailed info on a protocol and breakdowns by token and chain.
@@ -162,10 +624,27 @@ class DefiLlama:
         
         Returns 
         -------
-        dictionary
+        dictionary, shared with concurrent callers asking for the same 
+        protocol, so copy it before modifying it
         """
         return self._get('TVL', f'/protocol/{protocol}')
 
+    def get_protocol_snapshot(self, protocol):
+        """Get a protocol's detailed info once, to build several data frames 
+        from it, such as TVL by chain and breakdowns by token, without 
+        downloading it again. Each data frame is built when first asked for.
+        
+        Parameters
+        ----------
+        protocol : string
+            Protocol name.
+        
+        Returns 
+        -------
+        ProtocolSnapshot
+        """
+        return ProtocolSnapshot(self.get_protocol(protocol), self)
+
     def get_protocol_curr_tvl_by_chain(self, protocol):
         """Get current TVL of a protocol.
 
@@ -178,12 +657,7 @@ class DefiLlama:
         -------
         data frame
         """
-        dd = self.get_protocol(protocol)['currentChainTvls']
-        if 'staking' in dd:
-            dd.pop('staking')
-        ss = pd.Series(dd)
-        ss.name='tvl'
-        return ss.to_frame()
+        return self.get_protocol_snapshot(protocol).curr_tvl_by_chain()
     
     def get_protocol_hist_tvl_by_chain(self, protocol):
         """Get historical TVL of a protocol by chain.
@@ -197,13 +671,74 @@ class DefiLlama:
         -------
         dict of data frames
         """
-        dd = self.get_protocol(protocol)
-        d1 = dd['currentChainTvls']
-        if 'staking' in d1:
-            d1.pop('staking')
-        chains = list(d1.keys())
-        return {chain: self._tidy_frame_tvl(
-            pd.DataFrame(dd['chainTvls'][chain]['tvl'])) for chain in chains}
+        return self.get_protocol_snapshot(protocol).hist_tvl_by_chain()
+
+    def iter_protocols_hist_tvl_by_chain(self, protocols):
+        """Get historical TVL by chain of many protocols, one protocol at a
+        time. Protocols are downloaded concurrently, at most `max_workers` at
+        a time, and yielded in the given order as they arrive, so memory
+        stays bounded by a few protocols however many there are.
+
+        Parameters
+        ----------
+        protocols : list
+            Protocol names, for example, ['aave', 'lido'].
+
+        Yields
+        ------
+        tuple of (protocol, dict of data frames), the second item being what
+        get_protocol_hist_tvl_by_chain() returns for the protocol
+        """
+        def fetch(protocol):
+            return protocol, self.get_protocol_hist_tvl_by_chain(protocol)
+        chosen = getattr(self._local, 'priority', None)
+        yield from self._imap(fetch, protocols,
+                              priority=BULK if chosen is None else chosen)
+
+    def write_protocols_hist_tvl_by_chain(self, where, protocols):
+        """Download historical TVL by chain of many protocols straight into a
+        Parquet dataset partitioned by protocol and chain, without holding
+        the whole dataset in memory. Each (protocol, chain) is written to
+        `where/protocol=<protocol>/chain=<chain>/part-0.parquet`, replacing
+        the file of an earlier run. Read it back with pd.read_parquet(where),
+        which adds `protocol` and `chain` columns. Requires pyarrow
+        (`pip install defillama2[parquet]`).
+
+        Parameters
+        ----------
+        where : string
+            Directory of the dataset. Created if it doesn't exist.
+        protocols : list
+            Protocol names, for example, ['aave', 'lido'].
+
+        Returns
+        -------
+        int, number of rows written. Rows have the columns `date` and `tvl`.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError: # optional dependency
+            raise ImportError("write_protocols_hist_tvl_by_chain requires "
+                              "pyarrow. Install it with `pip install "
+                              "defillama2[parquet]`.") from None
+        schema = pa.schema([('date', pa.timestamp('ns', tz='UTC')),
+                            ('tvl', pa.float64())])
+        where = os.path.expanduser(where)
+        nrows = 0
+        for protocol, frames in self.iter_protocols_hist_tvl_by_chain(
+                protocols):
+            for chain, df in frames.items():
+                # partition values are URL-encoded, as pyarrow expects
+                path = os.path.join(
+                    where, 'protocol=' + quote(protocol, safe=''),
+                    'chain=' + quote(chain, safe=''))
+                os.makedirs(path, exist_ok=True)
+                pq.write_table(pa.Table.from_pandas(
+                    df.reset_index(), schema=schema, preserve_index=False),
+                    os.path.join(path, 'part-0.parquet'))
+                nrows += len(df)
+        return nrows
 
     # --- coins --- #
     
@@ -217,25 +752,224 @@ class DefiLlama:
         return df
 
     def _tidy_frame_hist_batch_prices(self, resp):
-        """ Convert json resp (dict) of batch prices to data frame. """
-        # extract chains and token addrs and put in a data frame
-        dfl = pd.DataFrame([item.split(':') for item in resp['coins'].keys()])
-        dfl.columns = ['chain', 'token_address']
-        # extract prices for all tokens and all timestamps
-        lst = list(resp['coins'].values())
-        # add token symbol as a col to dfl to merge with dfr later
-        dfl['symbol'] = [elt['symbol'] for elt in lst]
-        # flatten the nested list of prices for all tokens and all timestamps 
-        # into a data frame
-        dfr = pd.json_normalize(lst, record_path='prices', meta='symbol')
-        # convert unix time (seconds) to utc datetime
-        dfr['timestamp'] = pd.to_datetime(dfr['timestamp'], unit='s', utc=True)
-        # merge on the symbol col
-        return pd.merge(dfl, dfr)
+        """ Convert json resp (dict) of batch prices to data frame, one row
+        per token and timestamp. """
+        coins = resp['coins']
+        # flatten the price points of all tokens into flat arrays in one pass,
+        # remembering which token each point belongs to. Tokens are told apart
+        # by their chain:token_address key, so tokens sharing a symbol (e.g.,
+        # USDC on two chains) don't get mixed up.
+        points = [pt for dd in coins.values() for pt in dd['prices']]
+        counts = [len(dd['prices']) for dd in coins.values()]
+        owner = np.repeat(np.arange(len(coins)), counts)
+        keys = [item.split(':', 1) for item in coins.keys()]
+        chains = np.array([key[0] for key in keys], dtype=object)
+        addrs = np.array([key[-1] for key in keys], dtype=object)
+        symbols = np.array([dd['symbol'] for dd in coins.values()],
+                           dtype=object)
+        timestamps = np.array([pt['timestamp'] for pt in points],
+                              dtype=np.int64)
+        return pd.DataFrame({
+            'chain': chains[owner],
+            'token_address': addrs[owner],
+            'symbol': symbols[owner],
+            # convert unix time (seconds) to utc datetime
+            'timestamp': pd.to_datetime(timestamps, unit='s', utc=True),
+            'price': np.array([pt['price'] for pt in points], dtype=float),
+            'confidence': np.array([pt.get('confidence') for pt in points],
+                                   dtype=float)})
+
+    def _get_coins(self, endpoint, coins, params=None):
+        """Call a COINS endpoint that ends with a comma separated list of 
+        coins, e.g. '/prices/current/'. The coins are split into batches 
+        that keep every URL within MAX_URL_LENGTH, which are downloaded 
+        concurrently.
+
+        Parameters
+        ----------
+        endpoint : string
+            Endpoint up to the list of coins.
+        coins : list
+            chain:token_address of each coin.
+        params : string
+            URL-encoded HTTP request parameters.
+
+        Returns
+        -------
+        JSON response (dict) for all batches, with coins in the same order 
+        as `coins`
+        """
+        budget = MAX_URL_LENGTH - len(COINS_BASE_URL + endpoint) \
+            - len(f'?{params}' if params else '')
+        batches, size = [[]], 0
+        for coin in coins:
+            # length once quoted in the URL, plus a comma
+            n = len(quote(coin, safe=':')) + 1
+            if batches[-1] and size + n > budget:
+                batches.append([])
+                size = 0
+            batches[-1].append(coin)
+            size += n
+        resps = self._map(
+            lambda batch: self._get('COINS', endpoint + ','.join(batch), 
+                                    params=params), 
+            batches)
+        # the api may not echo back the letter case of token addresses
+        order = {coin.lower(): i for i, coin in enumerate(coins)}
+        items = [item for resp in resps for item in resp['coins'].items()]
+        items.sort(key=lambda item: order.get(item[0].lower(), len(order)))
+        return {'coins': dict(items)}
+
+    def _merge_coins(self, resps):
+        """ Merge json resps (dicts) of price points by coin, concatenating 
+        the prices of a coin found in several resps, without modifying the 
+        resps, which may be shared. """
+        if len(resps) == 1:
+            return resps[0]
+        res = dict()
+        for resp in resps:
+            for coin, dd in resp['coins'].items():
+                if coin in res:
+                    res[coin]['prices'] = res[coin]['prices'] + dd['prices']
+                else:
+                    res[coin] = dict(dd)
+        return {'coins': res}
+
+    def _plan_batch_historical(self, chain_token_addr_timestamps):
+        """Pack (coin, timestamp) pairs into as few /batchHistorical requests
+        as possible, each with at most MAX_BATCH_POINTS pairs and a URL 
+        within MAX_URL_LENGTH. Requests are filled coin by coin, so a coin's 
+        timestamps stay together unless they overflow a request.
+
+        Parameters
+        ----------
+        chain_token_addr_timestamps : dictionary
+            Each key is a chain:token_address; each value is a list of unix 
+            timestamps in seconds.
+
+        Returns
+        -------
+        list of dictionaries, the `coins` parameter of each request
+        """
+        # encoded length of the url without any coins: base, endpoint, 
+        # `?coins=` and the braces
+        budget = MAX_URL_LENGTH - len(COINS_BASE_URL) \
+            - len('/batchHistorical/?coins=') - len(quote('{}'))
+        comma = len(quote(','))
+        plan, points, size = [dict()], 0, 0
+        for coin, tss in chain_token_addr_timestamps.items():
+            # `"coin":[]` plus a comma
+            key_cost = len(quote(json.dumps(coin) + ':[]')) + comma
+            for ts in tss:
+                cost = len(str(ts)) + comma
+                if coin not in plan[-1]:
+                    cost += key_cost
+                if points and (points == MAX_BATCH_POINTS 
+                               or size + cost > budget):
+                    plan.append(dict())
+                    points, size = 0, 0
+                    cost = len(str(ts)) + comma + key_cost
+                plan[-1].setdefault(coin, []).append(ts)
+                points += 1
+                size += cost
+        if not points and len(plan) == 1:
+            # nothing to price, send the request as given
+            return [dict(chain_token_addr_timestamps)]
+        return plan
+
+    def _get_batch_historical(self, chain_token_addr_timestamps):
+        """ Call /batchHistorical, in as many requests as the API limits 
+        require, and return the json resp (dict) merged over all requests. """
+        def fetch(coins):
+            val = json.dumps(coins, separators=(',', ':'), default=int)
+            param = urlencode(dict(coins=val), quote_via=quote)
+            return self._get('COINS', '/batchHistorical/', params = param)
+        return self._merge_coins(self._map(
+            fetch, self._plan_batch_historical(chain_token_addr_timestamps)))
+
+    def _match_requested(self, requested, points):
+        """ Assign each price point returned by /batchHistorical to the 
+        nearest requested unix timestamp. Returns dict of requested timestamp 
+        to price point. """
+        if not requested or not points:
+            return dict()
+        req = np.unique(np.asarray(requested, dtype=np.int64))
+        got = np.array([pt['timestamp'] for pt in points], dtype=np.int64)
+        i = np.clip(np.searchsorted(req, got), 1, len(req) - 1) \
+            if len(req) > 1 else np.zeros(len(got), dtype=np.int64)
+        left = np.maximum(i - 1, 0)
+        nearest = np.where(np.abs(got - req[left]) <= np.abs(got - req[i]),
+                           left, i)
+        dist = np.abs(got - req[nearest])
+        res = dict()
+        # visit farthest points first so the closest point wins on ties
+        for j in np.argsort(-dist, kind='stable'):
+            res[int(req[nearest[j]])] = points[j]
+        return res
+
+    def _get_batch_historical_cached(self, chain_token_addr_timestamps):
+        """ Same as _get_batch_historical(), but only requests (token, 
+        timestamp) pairs not held by the price cache and stores new ones. """
+        held = self.price_cache.get(chain_token_addr_timestamps)
+        missing = dict()
+        for coin, tss in chain_token_addr_timestamps.items():
+            tss = [ts for ts in tss if int(ts) not in held.get(coin, {})]
+            if tss:
+                missing[coin] = tss
+        if missing or not held:
+            resp = self._get_batch_historical(
+                missing or chain_token_addr_timestamps)
+            # the api may not echo back the letter case of token addresses
+            got = {key.lower(): dd for key, dd in resp['coins'].items()}
+            for coin, tss in (missing or chain_token_addr_timestamps).items():
+                dd = got.get(coin.lower(), {'symbol': None, 'prices': []})
+                records = {
+                    ts: dict(pt, symbol=dd['symbol']) for ts, pt in 
+                    self._match_requested(tss, dd['prices']).items()}
+                # remember pairs without a price too, so they aren't 
+                # requested again, like PriceStore does for missing hours
+                for ts in tss:
+                    records.setdefault(int(ts), NO_PRICE)
+                self.price_cache.put(coin, records)
+                held.setdefault(coin, dict()).update(records)
+        # rebuild the json resp from held prices
+        res = dict()
+        for coin in chain_token_addr_timestamps:
+            records = sorted((rec for rec in held.get(coin, {}).values() 
+                              if rec['price'] is not None),
+                             key=lambda rec: rec['timestamp'])
+            if records:
+                res[coin] = dict(
+                    symbol=records[0]['symbol'],
+                    prices=[dict(timestamp=rec['timestamp'], price=rec['price'],
+                                 confidence=rec.get('confidence'))
+                            for rec in records])
+        return {'coins': res}
+
+    def _get_hist_snapshot_cached(self, coins, unix_ts):
+        """ Call /prices/historical for the coins not held by the price cache 
+        and return the json resp (dict) for all coins. """
+        ts = int(unix_ts)
+        held = self.price_cache.get({coin: [ts] for coin in coins})
+        missing = [coin for coin in coins if coin not in held]
+        if missing:
+            resp = self._get_coins(f'/prices/historical/{unix_ts}/', missing)
+            # the api may not echo back the letter case of token addresses
+            got = {key.lower(): rec for key, rec in resp['coins'].items()}
+            for coin in missing:
+                # coins without a price are remembered too
+                rec = got.get(coin.lower(), NO_PRICE)
+                self.price_cache.put(coin, {ts: rec})
+                held[coin] = {ts: rec}
+        return {'coins': {coin: held[coin][ts] for coin in coins 
+                          if held[coin][ts]['price'] is not None}}
 
     def get_tokens_curr_prices(self, token_addrs_n_chains):
         """Get current prices of tokens by contract address.
 
+        Any number of tokens can be given; long lists are split into several
+        requests that are sent concurrently.
+
         Parameters
         ----------
         token_addrs_n_chains : dictionary
@@ -249,15 +983,20 @@ class DefiLlama:
         -------
         data frame
         """
-        ss = ','.join([v + ':' +k for k, v in token_addrs_n_chains.items()])
-        resp = self._get('COINS', f'/prices/current/{ss}')
+        coins = [v + ':' +k for k, v in token_addrs_n_chains.items()]
+        resp = self._get_coins('/prices/current/', coins)
         df = self._tidy_frame_price(resp)
         df = df.set_index('timestamp')
-        return df.loc[:, ['symbol','price','chain','decimals','token_address']] 
+        return self._compact(
+            df.loc[:, ['symbol','price','chain','decimals','token_address']],
+            prices=['price'])
 
     def get_tokens_earliest_prices(self, token_addrs_n_chains):
         """Get earliest timestamp price record for tokens.
 
+        Any number of tokens can be given; long lists are split into several
+        requests that are sent concurrently.
+
         Parameters
         ----------
         token_addrs_n_chains : dictionary
@@ -271,16 +1010,20 @@ class DefiLlama:
         -------
         data frame
         """
-        ss = ','.join([v + ':' +k for k, v in token_addrs_n_chains.items()])
-        resp = self._get('COINS', f'/prices/first/{ss}')
+        coins = [v + ':' +k for k, v in token_addrs_n_chains.items()]
+        resp = self._get_coins('/prices/first/', coins)
         df = self._tidy_frame_price(resp)
         df = df.rename(columns={'timestamp':'earliest_timestamp'})
-        return df.loc[:, ['symbol','chain','earliest_timestamp',
-                          'price','token_address']]
+        return self._compact(df.loc[:, ['symbol','chain','earliest_timestamp',
+                                        'price','token_address']],
+                             prices=['price'])
 
     def get_tokens_hist_snapshot_prices(self, token_addrs_n_chains, timestamp):
         """Get historical snapshot prices of tokens by contract address.
 
+        Any number of tokens can be given; long lists are split into several
+        requests that are sent concurrently.
+
         Parameters
         ----------
         token_addrs_n_chains : dictionary
@@ -296,12 +1039,16 @@ class DefiLlama:
         -------
         data frame
         """
-        ss = ','.join([v + ':' +k for k, v in token_addrs_n_chains.items()])
+        coins = [v + ':' +k for k, v in token_addrs_n_chains.items()]
         unix_ts = pd.to_datetime(timestamp, utc=True).value / 1e9
-        resp = self._get('COINS', f'/prices/historical/{unix_ts}/{ss}')
+        if self.price_cache is None:
+            resp = self._get_coins(f'/prices/historical/{unix_ts}/', coins)
+        else:
+            resp = self._get_hist_snapshot_cached(coins, unix_ts)
         df = self._tidy_frame_price(resp)
         df = df.set_index('timestamp')
-        return df.loc[:, ['symbol','price','chain','token_address']]
+        df = df.loc[:, ['symbol','price','chain','token_address']]
+        return self._compact(df, prices=['price'])
         
     def get_tokens_hist_batch_prices(self, chain_token_addr_timestamps):
         """Get historical prices of tokens by chain at multiple timestamps.
@@ -319,13 +1066,42 @@ class DefiLlama:
         -------
         data frame
         """
-        val = str(chain_token_addr_timestamps).replace("'", '"')
-        param = urlencode(dict(coins=val), quote_via=quote)
-        resp = self._get('COINS', '/batchHistorical/', params = param)
+        return self._compact(
+            self._hist_batch_prices(chain_token_addr_timestamps),
+            prices=['price'])
+
+    def _hist_batch_prices(self, chain_token_addr_timestamps):
+        """ Same as get_tokens_hist_batch_prices(), without compacting, for
+        methods that build their frames from it. """
+        if self.price_cache is None:
+            resp = self._get_batch_historical(chain_token_addr_timestamps)
+        else:
+            resp = self._get_batch_historical_cached(chain_token_addr_timestamps)
         df = self._tidy_frame_hist_batch_prices(resp)
         df = df.set_index('timestamp')
         return df.loc[:, ['symbol','price','chain','token_address']] 
 
+    def _get_hist_batch_prices_in_chunks(self, token_addrs_n_chains, dttms):
+        """Get historical prices of tokens at many timestamps, as a bulk 
+        download split into requests by _plan_batch_historical() and 
+        downloaded concurrently.
+
+        Parameters
+        ----------
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token 
+            address resides.
+        dttms : list
+            Unix timestamps in seconds, in ascending order.
+
+        Returns
+        -------
+        data frame
+        """
+        dd = {f'{v}:{k}':list(dttms) for k, v in token_addrs_n_chains.items()}
+        with self._bulk():
+            return self._hist_batch_prices(dd)
+
     def get_daily_open_close(self, token_addrs_n_chains, start, end, kind='close'):
         """Get historical daily open and close prices of tokens by contract 
         address. Data on both the starting and end dates are included. 
@@ -343,70 +1119,57 @@ class DefiLlama:
         end : string
             End date, for example, '2022-01-01'
         kind : string
-            Either 'close' (default, at 23:59:59) or 'open' (at 00:00:00). Does 
-            NOT support other values at the moment.
+            'close' (default, at 23:59:59), 'open' (at 00:00:00) or 'both'. 
+            'both' returns open and close prices from one set of requests. 
 
         Returns 
         -------
-        data frame
+        data frame where each row is a date and each column is a token. For 
+        kind='both', the columns are a MultiIndex of ('open' or 'close', token).
         """
+        if kind not in ('open', 'close', 'both'):
+            raise Exception("Only 'open', 'close' or 'both' are supported.")
+        day = 24 * 3600
         start = pd.to_datetime(start, format='%Y-%m-%d', utc=True)
         end   = pd.to_datetime(end, format='%Y-%m-%d', utc=True) 
-        today = pd.to_datetime('today', utc=True).date()
-        if (end.date() == today) and (kind == 'close'): 
-            end -= pd.Timedelta(days=1)
-        dates = pd.date_range(start, end) # , inclusive='left'
-
-        # get unix seconds for each date 
-        if kind == 'close':
-            dttms = [int(dt.replace(hour=23, minute=59, second=59).timestamp()) 
-                     for dt in dates]
-        elif kind == 'open':
-            dttms = [int(dt.replace(hour=0, minute=0, second=0).timestamp()) 
-                     for dt in dates]
-        else: 
-            raise Exception("Only 'open' or 'close' are supported.")
-
-        # necessary due to api limit
-        chunk_size = 30 # 30 days
-        if len(dttms) <= chunk_size:
-            # make input dict for getting historical batch prices
-            dd = {f'{v}:{k}':dttms for k, v in token_addrs_n_chains.items()}            
-            df = self.get_tokens_hist_batch_prices(dd)
-        else: # break into batches and iterate due to API call limit
-            nchunks = int(np.ceil(len(dttms) / chunk_size))
-            lst = list()
-            for i in range(nchunks):
-                # i = 11
-                # make input dict for getting historical batch prices
-                dd = {f'{v}:{k}':dttms[i*chunk_size:(i+1)*chunk_size]
-                      for k, v in token_addrs_n_chains.items()}
-                # download historical prices at these time points
-                lst.append(self.get_tokens_hist_batch_prices(dd))
-                time.sleep(0.1)
-                # print(len(lst))
-            df = pd.concat(lst, axis=0)
+        # unix seconds at the start of each date
+        days = pd.date_range(start, end).asi8 // 10**9
+        # a date opens at 00:00:00 and closes at 23:59:59, a second before 
+        # the next date opens, so both are served by the price point nearest to
+        # the midnight in between. 'both' requests each midnight only once.
+        if kind == 'open':
+            dttms = days
+        elif kind == 'close':
+            dttms = days + day - 1
+        else:
+            dttms = np.union1d(days, days + day)
+        # skip times that haven't happened yet, e.g., today's close
+        dttms = dttms[dttms <= pd.to_datetime('now', utc=True).timestamp()]
+
+        df = self._get_hist_batch_prices_in_chunks(
+            token_addrs_n_chains, dttms.tolist())
 
         # clean data so that the resulting frame has 
         #   - each row is a date
         #   - each column is a token
         #   - each value is a price (open or close)
         df = df.reset_index()
-        if kind == 'close':
-            df['date'] = np.where(df.timestamp.dt.hour == 0, 
-                                  df.timestamp.dt.date - pd.Timedelta(days=1), 
-                                  df.timestamp.dt.date)
-        if kind == 'open':
-            df['date'] = np.where(df.timestamp.dt.hour == 0, 
-                                  df.timestamp.dt.date, 
-                                  df.timestamp.dt.date + pd.Timedelta(days=1))
-        df = df.groupby(['date', 'symbol'])['price'].mean()
-        df = df.reset_index().pivot(index='date', columns='symbol', values='price')
-        df.columns.name = None
-        df.index = pd.to_datetime(df.index, utc=True).date # date is an attribute
-        # here, and calling date() as a method throws error. 
+        secs = df['timestamp'].astype(np.int64).to_numpy() // 10**9
+        midnight = (secs + day // 2) // day * day
+        frames = dict()
+        for nm in (['open', 'close'] if kind == 'both' else [kind]):
+            # a point near midnight opens that date and closes the date before
+            date = midnight if nm == 'open' else midnight - day
+            keep = np.isin(date, days)
+            frames[nm] = df.loc[keep, ['symbol', 'price']]\
+                .assign(date=date[keep])\
+                .groupby(['date', 'symbol'])['price'].mean().unstack()
+        df = frames[kind] if kind != 'both' else pd.concat(frames, axis=1)
+        df.columns.names = [None] * df.columns.nlevels
+        df.index = pd.to_datetime(df.index, unit='s', utc=True).date # date is 
+        # an attribute here, and calling date() as a method throws error. 
         df.index.name='date'
-        return df
+        return self._compact(df, prices=True)
 
     def get_tokens_hist_prices(self, token_addrs_n_chains, start, end, freq='hourly'):
         """Get historical hourly or daily prices of tokens by contract address. 
@@ -426,91 +1189,310 @@ class DefiLlama:
         end : string
             End date, for example, '2022-11-30'. 
         freq : string
-            Data granularity, 'hourly' (default) or 'daily'. Does NOT support 
-            other values at the moment.
+            Data granularity, 'hourly' (default), 'daily', or any pandas 
+            offset alias, for example, '4h', 'W' or 'M'. For any value other 
+            than 'hourly', the open, low, high, close, median, mean and std of 
+            the hourly prices in each period are returned, where open and 
+            close are the first and last hourly prices in the period. 
 
         Returns 
         -------
-        data frame
+        data frame, where each row is a datetime and each column a token for 
+        'hourly'. Otherwise, each row is a period (a date for 'daily') and the 
+        columns are a MultiIndex of (statistic, token).
         """
-        start = pd.to_datetime(start, format='%Y-%m-%d', utc=True)
-        end   = pd.to_datetime(end, format='%Y-%m-%d', utc=True) + pd.Timedelta(days=1)
-        now   = pd.to_datetime('now', utc=True)
-        dttms = pd.date_range(start, end, inclusive='left', freq='60min')
-        # convert to unix seconds and 
-        # give 4 hours buffer to ensure DeFiLlama data are available
-        dttms = [int(dttm.timestamp()) for dttm in dttms 
-                 if dttm < now-pd.Timedelta(hours=4)] 
-        
-        # necessary due to api limit
-        chunk_size = 24*2 # 2 days
-        if len(dttms) <= chunk_size:
-            # make input dict for getting historical batch prices
-            dd = {f'{v}:{k}':dttms for k, v in token_addrs_n_chains.items()}
-            df = self.get_tokens_hist_batch_prices(dd)
-        else: # break into batches and iterate due to API call limit
-            nchunks = int(np.ceil(len(dttms) / chunk_size))
-            lst = list()
-            for i in range(nchunks):
-                # i = 11
-                # make input dict for getting historical batch prices
-                dd = {f'{v}:{k}':dttms[i*chunk_size:(i+1)*chunk_size]
-                      for k, v in token_addrs_n_chains.items()}
-                # download historical prices at these time points
-                lst.append(self.get_tokens_hist_batch_prices(dd))
-                time.sleep(0.1)
-                # print(len(lst))
-            df = pd.concat(lst, axis=0)
-        
-        # clean data so that the resulting frame has 
-        #   - each row is a datetime
-        #   - each column is a token
-        #   - each value is a price (open or close)
-        df = df.reset_index()
-        df['datetime'] = [elt.round(freq='H') for elt in df['timestamp']]
-        # df[['timestamp', 'datetime']].head(10)
-        # `datetime` can have duplicates, so take their avg price
-        df = df.groupby(['datetime', 'symbol']).agg({'price':'mean'})
-        df = df.reset_index()\
-            .pivot(index='datetime', columns='symbol', values='price')
+        # each row is a datetime and each column a token, averaging tokens 
+        # that share a symbol
+        df = pd.concat(self._iter_hourly_prices(
+            token_addrs_n_chains, start, end))
+        df = df.groupby(['datetime', 'symbol'])['price'].mean().unstack()
         df.columns.name = None
         df.index = pd.to_datetime(df.index, utc=True)
         
-        # derive daily prices if user requests them instead of hourly data
+        if freq in ('hourly', 'hour'):
+            return self._compact(df, prices=True)
+        # derive prices at a lower frequency from the hourly data
+        df = self._resample_prices(df, 'D' if freq == 'daily' else freq)
         if freq == 'daily':
-            symbols = df.columns
-            # calculate daily prices using hourly data
-            daily_open = df.asfreq('1d')
-            daily_low = df.resample('D').min()
-            daily_high = df.resample('D').max()
-            daily_close = daily_open.shift(-1)
-            daily_med = df.resample('D').median()
-            daily_avg = df.resample('D').mean()
-            daily_std = df.resample('D').std()
-            # assign header 
-            daily_open.columns = pd.MultiIndex.from_tuples(
-                [('open', symbol) for symbol in symbols])
-            daily_low.columns = pd.MultiIndex.from_tuples(
-                [('low', symbol) for symbol in symbols])
-            daily_high.columns = pd.MultiIndex.from_tuples(
-                [('high', symbol) for symbol in symbols])
-            daily_close.columns = pd.MultiIndex.from_tuples(
-                [('close', symbol) for symbol in symbols])
-            daily_med.columns = pd.MultiIndex.from_tuples(
-                [('median', symbol) for symbol in symbols])
-            daily_avg.columns = pd.MultiIndex.from_tuples(
-                [('mean', symbol) for symbol in symbols])
-            daily_std.columns = pd.MultiIndex.from_tuples(
-                [('std', symbol) for symbol in symbols])
-            # join together
-            df = pd.concat([daily_open, daily_low, daily_high, daily_close, 
-                            daily_med, daily_avg, daily_std], axis=1)
             # change index from DateTime to Date
             df.index = pd.to_datetime(df.index, utc=True).date # date is an 
             # attribute here, and calling the date() method throws error. 
             df.index.name='date'
-        return df
+        return self._compact(df, prices=True)
+
+    def _resample_prices(self, df, freq):
+        """Aggregate a frame of prices (each row a datetime, each column a 
+        token) to a lower frequency in one vectorized pass.
+
+        Each period's open and close are its first and last available prices;
+        low, high, median, mean and std are taken over the prices within the 
+        period. No statistic uses prices from another period, so a period 
+        without any price is all NaN.
+
+        Parameters
+        ----------
+        df : data frame
+            Prices in ascending datetime order.
+        freq : string
+            Any pandas offset alias, for example, '4h', 'D', 'W' or 'M'.
+
+        Returns
+        -------
+        data frame where each row is a period and the columns are a 
+        MultiIndex of (statistic, token)
+        """
+        # number of rows in each period, including empty periods. Rows are
+        # sorted, so every period is a contiguous run of rows.
+        counts = pd.Series(0, index=df.index).resample(freq).count()
+        periods = np.repeat(np.arange(len(counts)), counts.to_numpy())
+        starts = np.cumsum(counts.to_numpy()) - counts.to_numpy()
+        # lay the prices out as (period, row within period, token), padding
+        # short periods with NaN, so all statistics are array reductions
+        vals = df.to_numpy(dtype=float)
+        x = np.full((len(counts), max(counts.max(), 1), vals.shape[1]), np.nan)
+        x[periods, np.arange(len(vals)) - starts[periods]] = vals
+
+        valid = ~np.isnan(x)
+        n = valid.sum(axis=1)
+        # NaN sorts last, so the k-th valid price of a period is at index k
+        ordered = np.sort(x, axis=1)
+
+        def kth(arr, k):
+            k = np.clip(k, 0, arr.shape[1] - 1)
+            return np.take_along_axis(arr, k[:, None, :], axis=1)[:, 0, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            first = kth(x, valid.argmax(axis=1))
+            last = kth(x, x.shape[1] - 1 - valid[:, ::-1].argmax(axis=1))
+            mean = np.nansum(x, axis=1) / n
+            std = np.sqrt(np.nansum((x - mean[:, None, :])**2, axis=1) 
+                          / (n - 1))
+            stats = dict(
+                open=first,
+                low=kth(ordered, np.zeros_like(n)),
+                high=kth(ordered, n - 1),
+                close=last,
+                median=(kth(ordered, (n - 1) // 2) + kth(ordered, n // 2)) / 2,
+                mean=mean,
+                std=np.where(n > 1, std, np.nan))
+        for key in ('open', 'low', 'high', 'close', 'median', 'mean'):
+            stats[key] = np.where(n > 0, stats[key], np.nan)
+        return pd.DataFrame(
+            np.hstack(list(stats.values())), index=counts.index,
+            columns=pd.MultiIndex.from_product([list(stats), df.columns]))
     
+    def iter_tokens_hist_prices(self, token_addrs_n_chains, start, end):
+        """Get historical hourly prices of tokens by contract address, one 
+        chunk of hours at a time. Chunks are downloaded concurrently and 
+        yielded in time order as they arrive, so memory stays bounded by a few
+        chunks however long the date range is. Data on both the starting and 
+        end dates are included.
+
+        Parameters
+        ----------
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token 
+            address resides. If getting price from coingecko, use token name as 
+            key and 'coingecko' as value. For example, 
+            {'0xdF574c24545E5FfEcb9a659c229253D4111d87e1':'ethereum', 
+             'ethereum':'coingecko'}
+        start : string
+            Start date, for example, '2022-11-01'
+        end : string
+            End date, for example, '2022-11-30'. 
+
+        Yields
+        ------
+        data frame with columns `datetime` (rounded to the hour), `chain`, 
+        `token_address`, `symbol` and `price`, one row per token and hour
+        """
+        for df in self._iter_hourly_prices(token_addrs_n_chains, start, end):
+            yield self._compact(df, prices=['price'])
+
+    def _iter_hourly_prices(self, token_addrs_n_chains, start, end):
+        """ Same as iter_tokens_hist_prices(), without compacting, for 
+        methods that build their frames from it. """
+        def tidy(df):
+            df = df.reset_index()
+            df['datetime'] = df['timestamp'].dt.round('h')
+            # `datetime` can have duplicates, so take their avg price
+            return df.groupby(['datetime', 'chain', 'token_address', 'symbol'],
+                              as_index=False, sort=False)['price'].mean()
+        for _, df in self._imap_hist_batch_prices(
+                token_addrs_n_chains, self._hourly_unix_secs(start, end), tidy):
+            yield df
+
+    def _imap_hist_batch_prices(self, token_addrs_n_chains, dttms, func):
+        """Get historical prices of tokens at many timestamps, in chunks of
+        timestamps downloaded concurrently, at most `max_workers` at a time.
+
+        Parameters
+        ----------
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token 
+            address resides.
+        dttms : list
+            Unix timestamps in seconds, in ascending order.
+        func : callable
+            Applied, in a pool thread, to the data frame returned by 
+            get_tokens_hist_batch_prices() for each chunk.
+
+        Yields
+        ------
+        tuple of (timestamps of the chunk, result of `func`), in time order
+        """
+        # break into chunks of at least 2 days, and of about one request's 
+        # worth of prices for narrow sets of tokens
+        size = max(24*2, MAX_BATCH_POINTS // max(len(token_addrs_n_chains), 1))
+        chunks = [dttms[i:i+size] for i in range(0, max(len(dttms), 1), size)]
+
+        def fetch(chunk):
+            dd = {f'{v}:{k}':chunk for k, v in token_addrs_n_chains.items()}
+            return chunk, func(self._hist_batch_prices(dd))
+        chosen = getattr(self._local, 'priority', None)
+        return self._imap(fetch, chunks, 
+                          priority=BULK if chosen is None else chosen)
+
+    def write_tokens_hist_prices(self, where, token_addrs_n_chains, start, 
+                                 end):
+        """Download historical hourly prices of tokens by contract address 
+        straight into a Parquet file, one row group per chunk of hours, 
+        without holding the whole range in memory. Data on both the starting 
+        and end dates are included. Requires pyarrow 
+        (`pip install defillama2[parquet]`).
+
+        Parameters
+        ----------
+        where : string or file-like object
+            Path of the Parquet file to write, or an open binary file or 
+            pyarrow output stream.
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token 
+            address resides. For example, 
+            {'0xdF574c24545E5FfEcb9a659c229253D4111d87e1':'ethereum', 
+             'ethereum':'coingecko'}
+        start : string
+            Start date, for example, '2022-11-01'
+        end : string
+            End date, for example, '2022-11-30'. 
+
+        Returns
+        -------
+        int, number of rows written. Rows have the columns yielded by 
+        iter_tokens_hist_prices().
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError: # optional dependency
+            raise ImportError("write_tokens_hist_prices requires pyarrow. "
+                              "Install it with `pip install "
+                              "defillama2[parquet]`.") from None
+        schema = pa.schema([('datetime', pa.timestamp('ns', tz='UTC')),
+                            ('chain', pa.string()), 
+                            ('token_address', pa.string()),
+                            ('symbol', pa.string()), ('price', pa.float64())])
+        nrows = 0
+        with pq.ParquetWriter(where, schema) as writer:
+            for df in self._iter_hourly_prices(token_addrs_n_chains, 
+                                               start, end):
+                writer.write_table(pa.Table.from_pandas(
+                    df, schema=schema, preserve_index=False))
+                nrows += len(df)
+        return nrows
+
+    def _hourly_unix_secs(self, start, end):
+        """ Unix seconds of every hour from `start` date to the end of `end` 
+        date, excluding the last 4 hours before now. """
+        start = pd.to_datetime(start, format='%Y-%m-%d', utc=True)
+        end   = pd.to_datetime(end, format='%Y-%m-%d', utc=True) + pd.Timedelta(days=1)
+        now   = pd.to_datetime('now', utc=True)
+        dttms = pd.date_range(start, end, inclusive='left', freq='60min')
+        # convert to unix seconds and 
+        # give 4 hours buffer to ensure DeFiLlama data are available
+        return [int(dttm.timestamp()) for dttm in dttms 
+                if dttm < now-pd.Timedelta(hours=4)]
+
+    def sync_tokens_hist_prices(self, store, token_addrs_n_chains, start, end):
+        """Download the hourly prices of tokens that a local PriceStore is 
+        missing between two dates, and add them to the store. Data on both the 
+        starting and end dates are included. Read the prices back with 
+        store.read().
+
+        Parameters
+        ----------
+        store : PriceStore
+            Local store of hourly prices.
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token 
+            address resides. If getting price from coingecko, use token name as 
+            key and 'coingecko' as value. For example, 
+            {'0xdF574c24545E5FfEcb9a659c229253D4111d87e1':'ethereum', 
+             'ethereum':'coingecko'}
+        start : string
+            Start date, for example, '2022-11-01'
+        end : string
+            End date, for example, '2022-11-30'. 
+
+        Returns
+        -------
+        series, number of hours added to the store for each token
+        """
+        hours = self._hourly_unix_secs(start, end)
+        # tokens missing the same hours are downloaded together
+        groups = dict()
+        for k, v in token_addrs_n_chains.items():
+            missing = store.missing_hours(f'{v}:{k}', hours)
+            if len(missing):
+                groups.setdefault(missing.tobytes(), (missing, {}))[1][k] = v
+        added = pd.Series(0, index=[f'{v}:{k}' for k, v in 
+                                    token_addrs_n_chains.items()], name='hours')
+
+        def tidy(df):
+            df = df.reset_index()
+            # snap to the nearest hour, averaging duplicates
+            secs = df['timestamp'].astype(np.int64) // 10**9
+            df['timestamp'] = (secs + 1800) // 3600 * 3600
+            df['coin'] = (df['chain'] + ':' + df['token_address']).str.lower()
+            return df.groupby(['coin', 'timestamp'], sort=False)\
+                .agg({'price':'mean', 'symbol':'first'})
+
+        for missing, tokens in groups.values():
+            symbols = dict()
+
+            def flush(frames, hours):
+                df = pd.concat(frames)
+                by_coin = {coin: da.droplevel('coin') for coin, da in 
+                           df.groupby(level='coin', sort=False)}
+                empty = df.iloc[:0].droplevel('coin')
+                for k, v in tokens.items():
+                    coin = f'{v}:{k}'
+                    da = by_coin.get(coin.lower(), empty).reindex(hours)
+                    # keep hours without a price so they aren't requested 
+                    # again, with the symbol of the token's other hours
+                    da['symbol'] = da['symbol'].ffill().bfill()
+                    if coin in symbols:
+                        da['symbol'] = da['symbol'].fillna(symbols[coin])
+                    if da['symbol'].notna().any():
+                        symbols[coin] = da['symbol'].iloc[-1]
+                    store.append(coin, 
+                                 da.rename_axis('timestamp').reset_index())
+                    added[coin] += len(da)
+
+            # append chunk by chunk, so that a long backfill is never held in
+            # memory at once. Chunks are buffered up to SYNC_FLUSH_POINTS 
+            # prices to avoid rewriting the files too often.
+            frames, buffered = [], []
+            for chunk, df in self._imap_hist_batch_prices(
+                    tokens, missing.tolist(), tidy):
+                frames.append(df)
+                buffered.extend(chunk)
+                if len(buffered) * len(tokens) >= SYNC_FLUSH_POINTS:
+                    flush(frames, buffered)
+                    frames, buffered = [], []
+            if buffered:
+                flush(frames, buffered)
+        return added
+
     def get_prices_at_regular_intervals(self, token_addrs_n_chains, end,
                                         end_format=None, span=30, period='4h'):
         """Get prices of tokens before user-supplied end time at regular intervals.
@@ -529,7 +1511,8 @@ class DefiLlama:
             Datetime string format for parsing `end`. For example, 
             '%Y-%m-%d' or '%Y-%m-%d %H:%M:%S'.
         span : int
-            Number of price points, defaults to 30.
+            Number of price points, defaults to 30. Spans longer than 
+            MAX_CHART_SPAN are split into windows downloaded concurrently.
         period : str
             Duration between data points, defaults to '4h'. Can use regular 
             chart candle notion like '4h' etc where: W = week, D = day, 
@@ -539,22 +1522,112 @@ class DefiLlama:
         -------
         data frame
         """
-        ss = ','.join([v + ':' +k for k, v in token_addrs_n_chains.items()])
+        coins = [v + ':' +k for k, v in token_addrs_n_chains.items()]
         unix_sec = pd.to_datetime(end, format=end_format, utc=True).timestamp()
-        param = dict(end=unix_sec, period=period, span=span)
-        param = urlencode(param, quote_via=quote)
-        base_url = "https://coins.llama.fi"
-        url = base_url + f'/chart/{ss}?'
-        resp = requests.Session()\
-            .request('GET', url, params=param, timeout=30)\
-            .json()
+        # split long spans into windows of at most MAX_CHART_SPAN points, 
+        # each ending one period before the next window starts
+        step = self._period_secs(period)
+        windows = []
+        while span > 0:
+            n = min(span, MAX_CHART_SPAN) if step else span
+            windows.append((unix_sec, n))
+            unix_sec -= n * (step or 0)
+            span -= n
+        windows = windows or [(unix_sec, span)]
+
+        def fetch(window):
+            param = dict(end=window[0], period=period, span=window[1])
+            param = urlencode(param, quote_via=quote)
+            return self._get_coins('/chart/', coins, params=param)
+        if len(windows) > 1:
+            with self._bulk():
+                resp = self._merge_coins(self._map(fetch, windows))
+        else:
+            resp = fetch(windows[0])
+        # pivot once, averaging timestamps duplicated across windows
         df = self._tidy_frame_hist_batch_prices(resp)
-        df = df.groupby(['timestamp', 'symbol'])\
-                .agg({'price':'mean'})\
-                .reset_index()\
-                .pivot(index='timestamp', columns='symbol', values='price')
+        df = df.groupby(['timestamp', 'symbol'])['price'].mean().unstack()
         df.columns.name = None
-        return df
+        return self._compact(df, prices=True)
+
+    def get_ledger_prices(self, coins, timestamps, tolerance=3600):
+        """Get the USD price of tokens at many event times, for example, 
+        every transfer in a ledger. Event times are snapped to the nearest 
+        hour and each distinct (token, hour) is requested only once through
+        /batchHistorical, so a million events cost about as many price points 
+        as there are distinct token-hours. Each event then gets the price 
+        point of its token nearest to its time.
+
+        Parameters
+        ----------
+        coins : list-like
+            chain:token_address of the token of each event, for example, 
+            'ethereum:0xdF574c24545E5FfEcb9a659c229253D4111d87e1' or 
+            'coingecko:ethereum'.
+        timestamps : list-like
+            Time of each event, as unix timestamps in seconds or 
+            human-readable timestamps in utc, for example, 
+            '2021-09-25 00:27:53'.
+        tolerance : int
+            Maximum seconds between an event and the price point used for it.
+            Events without a price point that close get a missing price.
+
+        Returns 
+        -------
+        data frame with columns `coin`, `timestamp`, `symbol`, `price` and 
+        `price_timestamp` (time of the price point used), in the same order 
+        as the events
+        """
+        events = pd.DataFrame({'coin': np.asarray(coins, dtype=object),
+                               'ts': self._unix_secs(timestamps)})
+        # distinct (token, hour) pairs over all events
+        events['hour'] = (events['ts'] + 1800) // 3600 * 3600
+        pairs = events.loc[:, ['coin', 'hour']].drop_duplicates()
+        dd = {coin: hours.sort_values().tolist() 
+              for coin, hours in pairs.groupby('coin')['hour']}
+        with self._bulk():
+            df = self._hist_batch_prices(dd).reset_index()
+
+        # look up the nearest price point of each event's token
+        # the api may not echo back the letter case of token addresses
+        prices = pd.DataFrame({
+            'key': (df['chain'] + ':' + df['token_address']).str.lower(),
+            'price_ts': df['timestamp'].astype(np.int64) // 10**9,
+            'symbol': df['symbol'], 'price': df['price']})
+        prices = prices.sort_values('price_ts', kind='stable')
+        events['key'] = events['coin'].str.lower()
+        events['pos'] = np.arange(len(events))
+        res = pd.merge_asof(events.sort_values('ts', kind='stable'), prices,
+                            left_on='ts', right_on='price_ts', by='key',
+                            direction='nearest', tolerance=int(tolerance))
+        res = res.sort_values('pos')
+        return self._compact(pd.DataFrame({
+            'coin': res['coin'].to_numpy(),
+            'timestamp': pd.to_datetime(res['ts'].to_numpy(), unit='s', 
+                                        utc=True),
+            'symbol': res['symbol'].to_numpy(),
+            'price': res['price'].to_numpy(),
+            'price_timestamp': pd.to_datetime(res['price_ts'].to_numpy(), 
+                                              unit='s', utc=True)}),
+            prices=['price'])
+
+    def _unix_secs(self, timestamps):
+        """ Unix seconds (int64 array) of unix timestamps in seconds or 
+        human-readable timestamps in utc. """
+        ts = pd.Series(timestamps)
+        if pd.api.types.is_numeric_dtype(ts):
+            return ts.to_numpy(dtype=np.int64)
+        return pd.to_datetime(ts, utc=True).astype(np.int64).to_numpy() \
+            // 10**9
+
+    def _period_secs(self, period):
+        """ Seconds in a chart period such as '4h' or 'W', or None if the
+        period can't be parsed. """
+        match = re.fullmatch(r'(\d*)([wdhm])', period.strip().lower())
+        if match is None:
+            return None
+        units = dict(w=7*24*3600, d=24*3600, h=3600, m=60)
+        return int(match.group(1) or 1) * units[match.group(2)]
     
     # no need to implement /percentage/{coins} cuz users can calculate 
     # % change using prices downloaded via the other functions.
@@ -575,9 +1648,92 @@ class DefiLlama:
         """
         unix_sec = pd.to_datetime(timestamp, utc=True).timestamp()
         resp = self._get('COINS', f'/block/{chain}/{unix_sec}')
+        self.block_index.add(chain, [resp['timestamp']], [resp['height']])
         df = pd.DataFrame(resp, index=range(1))
         df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True)
-        return df
+        return self._compact(df)
+
+    def get_closest_blocks(self, chain, timestamps, tolerance=60):
+        """Get the closest block to each of many timestamps. 
+        
+        Resolved blocks are kept in `block_index`. A timestamp that falls 
+        between two known blocks at most `tolerance` seconds apart is resolved
+        by interpolating their heights, without any request. The others are 
+        resolved by downloading blocks concurrently: when several timestamps
+        are close together, it downloads a few blocks around them and 
+        interpolates, instead of one request per timestamp.
+
+        Parameters
+        ----------
+        chain : string
+            Name of the chain.
+        timestamps : list-like
+            Unix timestamps in seconds, or human-readable timestamps in utc, 
+            for example, '2021-09-25 00:27:53'.
+        tolerance : int
+            Maximum seconds between the two known blocks around a timestamp 
+            for interpolating between them. Use a few block times of the 
+            chain; a tolerance below the block time means one request per 
+            timestamp.
+
+        Returns 
+        -------
+        data frame with columns `timestamp` and `height`, in the same order 
+        as `timestamps`
+        """
+        secs = self._unix_secs(timestamps)
+        uniq, inverse = np.unique(secs, return_inverse=True)
+        heights = self.block_index.lookup(chain, uniq, tolerance)
+
+        def fetch(unix_sec):
+            return self._get('COINS', f'/block/{chain}/{unix_sec}')
+
+        def resolve(unix_secs):
+            with self._bulk():
+                resps = self._map(fetch, unix_secs)
+            ts = np.array([r['timestamp'] for r in resps], dtype=np.int64)
+            hs = np.array([r['height'] for r in resps], dtype=np.int64)
+            self.block_index.add(chain, ts, hs)
+            return ts, hs
+
+        todo = uniq[heights < 0]
+        if len(todo):
+            # per cell of half the tolerance, download the blocks at its two
+            # edges, which bracket all its timestamps, if that takes fewer
+            # requests than downloading a block per timestamp. The upper edge
+            # of the current cell is now, as future blocks can't be asked for.
+            now = int(pd.to_datetime('now', utc=True).timestamp())
+            step = max(int(tolerance) // 2, 1)
+            lower = todo // step * step
+            upper = np.minimum(lower + step, now)
+            cells, first, counts = np.unique(lower, return_index=True,
+                                             return_counts=True)
+            edges = set()
+            for lo, hi, count in zip(cells.tolist(), upper[first].tolist(),
+                                     counts.tolist()):
+                new = {lo, hi} - edges
+                if len(new) < count:
+                    edges |= new
+            direct = todo[~(np.isin(lower, list(edges))
+                            & np.isin(upper, list(edges)))]
+            if direct.size:
+                heights[np.searchsorted(uniq, direct)] = \
+                    resolve(direct.tolist())[1]
+            if edges:
+                # interpolate from the edge blocks themselves, as the index
+                # doesn't keep recent blocks
+                t, h = resolve(sorted(edges))
+                t, i = np.unique(t, return_index=True)
+                left = heights < 0
+                heights[left] = interpolate_blocks(
+                    t, h[i], uniq[left], tolerance)
+            # blocks further apart than the tolerance around the edges
+            left = np.flatnonzero(heights < 0)
+            if left.size:
+                heights[left] = resolve(uniq[left].tolist())[1]
+        return self._compact(pd.DataFrame({
+            'timestamp': pd.to_datetime(secs, unit='s', utc=True),
+            'height': heights[inverse]}))
     
     # --- stablecoins --- #
     
@@ -601,13 +1757,14 @@ class DefiLlama:
         
         res = []
         for d0 in lst:
-            _ = d0.pop('chainCirculating')
-            _ = d0.pop('chains')
+            # don't modify the resp, concurrent callers may share it
+            d0 = {k: v for k, v in d0.items() 
+                  if k not in ('chainCirculating', 'chains')}
             res.append(pd.DataFrame(d0).reset_index(drop=True))
         df = pd.concat(res)
         df['id'] = df.id.astype(int)
         df = df.set_index('id')
-        return df
+        return self._compact(df, prices=['price'])
 
     def get_stablecoins_circulating_by_chain(self, include_price=False):
         """Get the circulating amounts for all stablecoins, broken down by chain.
@@ -629,8 +1786,7 @@ class DefiLlama:
         
         dict_of_dfs = dict()
         for d0 in lst:
-            d1 = d0.pop('chainCirculating')
-            _  = d0.pop('chains')
+            d1 = d0['chainCirculating']
             haha = []
             for k, v in d1.items():
                 da = pd.DataFrame(v)
@@ -640,7 +1796,7 @@ class DefiLlama:
                        .set_index('chain')
                 haha.append(da)
             dict_of_dfs[d0['symbol']] = pd.concat(haha)
-        return dict_of_dfs
+        return self._compact(dict_of_dfs)
 
     def get_stablecoin_hist_mcap(self, id):
         """Get all available historical mcap values for a stablecoin.
@@ -660,7 +1816,7 @@ class DefiLlama:
         df = pd.concat([pd.DataFrame(d) for d in resp])        
         df['date'] = pd.to_datetime(df['date'], unit='s', utc=True)
         df = df.set_index('date')
-        return df
+        return self._compact(df)
 
     def get_stablecoin_hist_mcap_on_a_chain(self, id, chain):
         """Get all available historical mcap values for a stablecoin on a 
@@ -683,7 +1839,7 @@ class DefiLlama:
         df = pd.concat([pd.DataFrame(d) for d in resp])        
         df['date'] = pd.to_datetime(df['date'], unit='s', utc=True)
         df = df.set_index('date')
-        return df
+        return self._compact(df)
 
     def get_stablecoins_curr_mcap_by_chain(self):
         """Get current mcap sum of all stablecoins on each chain.
@@ -697,7 +1853,7 @@ class DefiLlama:
         df = df.reset_index().rename(columns={'index':'type'})
         df = df.set_index('name').drop(['gecko_id', 'tokenSymbol'], axis=1)
         df.index.name = 'chain'
-        return df
+        return self._compact(df)
 
     def get_stablecoins_prices(self):
         """Get historical prices of all stablecoins.
@@ -711,7 +1867,7 @@ class DefiLlama:
         df = df.reset_index().rename(columns={'index':'stablecoin'})
         df['date'] = pd.to_datetime(df['date'], unit='s', utc=True)
         df = df.set_index('date')
-        return df
+        return self._compact(df, prices=['prices'])
 
     # no need to implement /stablecoin/{asset} cuz it just returns all data in 
     # a deeply nested list that other api endpoints return separately.
@@ -731,7 +1887,7 @@ class DefiLlama:
         df = pd.json_normalize(lst)
         df.columns = df.columns.str.replace('predictions.', '', regex=False)
         df['apyPct30D'] = df.apyPct30D.astype(float)
-        return df
+        return self._compact(df)
 
     def get_pool_hist_apy(self, pool_id):
         """Get historical APY and TVL of a pool.
@@ -757,7 +1913,7 @@ class DefiLlama:
         df[numstr_cols] = df[numstr_cols].astype(float)
         # daily avg
         df = df.groupby('date').agg('mean')
-        return df
+        return self._compact(df)
 
     # --- volumes --- #
 
@@ -836,7 +1992,7 @@ class DefiLlama:
                   dataType=data_type)
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', '/overview/dexs', params = param)
-        return self._tidy_frame_volume(resp)
+        return self._compact(self._tidy_frame_volume(resp))
 
     def get_dexes_volumes_this_chain(self, chain, data_type='dailyVolume'):
         """Get transaction volumes of all dexes, including 'Dexes', 
@@ -867,7 +2023,7 @@ class DefiLlama:
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', f'/overview/dexs/{chain.lower()}', 
                          params = param)
-        return self._tidy_frame_volume(resp)
+        return self._compact(self._tidy_frame_volume(resp))
 
     def get_daily_volumes_this_dex(self, dex, data_type='dailyVolume'):
         """Get historical daily transaction volumes of a dex.
@@ -890,7 +2046,7 @@ class DefiLlama:
                   dataType=data_type)
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', f'/summary/dexs/{dex}', params = param)
-        return self._tidy_frame_volume_this_dex(resp)
+        return self._compact(self._tidy_frame_volume_this_dex(resp))
 
     def get_options_dexes_volumes(self, data_type='dailyNotionalVolume'):
         """Get transaction volumes of all options dexes.
@@ -915,7 +2071,7 @@ class DefiLlama:
                   dataType=data_type)
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', '/overview/options', params = param)
-        return self._tidy_frame_volume(resp)
+        return self._compact(self._tidy_frame_volume(resp))
 
     def get_options_dexes_volumes_this_chain(self, chain, 
                                              data_type='dailyNotionalVolume'):
@@ -945,7 +2101,7 @@ class DefiLlama:
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', f'/overview/options/{chain.lower()}', 
                          params = param)
-        return self._tidy_frame_volume(resp)
+        return self._compact(self._tidy_frame_volume(resp))
 
     def get_daily_volumes_this_options_dex(self, dex, 
                                            data_type='dailyNotionalVolume'):
@@ -968,7 +2124,7 @@ class DefiLlama:
                   dataType=data_type)
         param = urlencode(dd, quote_via=quote)
         resp = self._get('VOLUMES', f'/summary/options/{dex}', params = param)
-        return self._tidy_frame_volume_this_dex(resp)
+        return self._compact(self._tidy_frame_volume_this_dex(resp))
                 
     # --- fees and revenue --- #
     
@@ -1001,7 +2157,7 @@ class DefiLlama:
             new_keys = [k.replace('volume', 'fees') for k in dd_res.keys()]
         if 'Revenue' in data_type:
             new_keys = [k.replace('volume', 'revenue') for k in dd_res.keys()]
-        return dict(zip(new_keys, dd_res.values()))
+        return self._compact(dict(zip(new_keys, dd_res.values())))
     
     def get_fees_this_chain(self, chain, data_type='dailyFees'):
         """Get fees paid to or fees accrued (revenue) by all protocols from a 
@@ -1036,7 +2192,7 @@ class DefiLlama:
             new_keys = [k.replace('volume', 'fees') for k in dd_res.keys()]
         if 'Revenue' in data_type:
             new_keys = [k.replace('volume', 'revenue') for k in dd_res.keys()]
-        return dict(zip(new_keys, dd_res.values()))
+        return self._compact(dict(zip(new_keys, dd_res.values())))
         
     def get_daily_fees_this_protocol(self, protocol, data_type='dailyFees'):
         """Get daily fees (paid by users) or revenue (accrued by the protocol) 
@@ -1065,7 +2221,7 @@ class DefiLlama:
             df.columns = df.columns.str.replace('volume', 'fees')
         if 'Revenue' in data_type:
             df.columns = df.columns.str.replace('volume', 'revenue')
-        return df
+        return self._compact(df)
         
     # --- bridges --- #
     
@@ -1080,7 +2236,7 @@ class DefiLlama:
         df = pd.DataFrame(resp['bridges'])\
             .drop(columns=['name', 'icon', 'chains', 'destinationChain'])
         df['chainsCnt'] = [len(dd['chains']) for dd in resp['bridges']]
-        return df
+        return self._compact(df)
     
     def get_bridge_volume(self, bridge_id):
         """Get volume summary of a particular bridge and volume breakdown by chain.
@@ -1127,9 +2283,10 @@ class DefiLlama:
             lst2.append(da2)
         df_summary_by_chain = pd.concat(lst1, ignore_index=True)
         df_deposits_withdraws_by_chain = pd.concat(lst2, ignore_index=True)
-        return {'summary':df_summary, 
-                'summary_by_chain': df_summary_by_chain, 
-                'deposits_withdraws_by_chain': df_deposits_withdraws_by_chain}
+        return self._compact({
+            'summary':df_summary, 
+            'summary_by_chain': df_summary_by_chain, 
+            'deposits_withdraws_by_chain': df_deposits_withdraws_by_chain})
 
     def get_daily_volume_this_bridge(self, bridge_id, chain='all'):
         """Get historical volumes for a bridge on a particular chain or on all 
@@ -1154,7 +2311,7 @@ class DefiLlama:
         resp = self._get('BRIDGES', f'/bridgevolume/{chain}?id={bridge_id}')
         df = pd.DataFrame(resp)
         df['date'] = pd.to_datetime(df['date'], unit='s', utc=True)
-        return df.set_index('date')
+        return self._compact(df.set_index('date'))
 
     def get_24h_token_volume_this_bridge(self, bridge_id, chain, date):
         """Get 24hr token and volume breakdown for a bridge. 
@@ -1194,7 +2351,7 @@ class DefiLlama:
         # part 4
         df4 = pd.DataFrame(resp['totalAddressWithdrawn']).T.reset_index(drop=True)
         df4.columns = [f'AddressWithdrawn_{nm}' for nm in df4.columns]
-        return pd.merge(df1, df2).join(df3).join(df4)
+        return self._compact(pd.merge(df1, df2).join(df3).join(df4))
 
     def get_tx_this_bridge(self, bridge_id, sourcechain, start, end, 
                            fromToAddrs_chains, limit=200):
@@ -1232,4 +2389,4 @@ class DefiLlama:
                   sourcechain=sourcechain, address=ss, limit=limit)
         param = urlencode(dd, quote_via=quote)
         resp = self._get('BRIDGES', f'/transactions/{bridge_id}', params=param) 
-        return pd.DataFrame(resp)
+        return self._compact(pd.DataFrame(resp))
@@ -0,0 +1,134 @@
+import heapq
+import itertools
+import threading
+import time
+
+# priority classes of requests, lower values are served first
+INTERACTIVE = 0
+BULK = 1
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Allows bursts of up to `capacity` calls and
+    `rate` calls per second on average.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Parameters
+        ----------
+        rate : float
+            Tokens added per second.
+        capacity : float
+            Maximum number of tokens held. Defaults to `rate` (at least 1).
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` tokens if they are available.
+
+        Returns
+        -------
+        float, 0 if the tokens were taken, otherwise seconds until they will
+        be available
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        """Block until `tokens` tokens are available, then take them."""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class _HostQueue:
+    """ Token bucket of one host plus the callers waiting for its tokens. """
+
+    def __init__(self, rate, capacity):
+        self.bucket = TokenBucket(rate, capacity)
+        self.waiting = [] # heap of (priority, arrival order)
+        self.cond = threading.Condition()
+
+
+class RequestScheduler:
+    """
+    Decides when requests may be sent. Each host has its own token bucket, so
+    a busy host doesn't slow down requests to the others. Callers waiting for
+    the same host are served by priority class (INTERACTIVE before BULK), then
+    in arrival order, so interactive lookups jump ahead of bulk backfills
+    while each host still gets exactly its allowed rate.
+
+    One scheduler can be shared by several DefiLlama instances to enforce a
+    quota across all of them.
+    """
+
+    def __init__(self, default_rate=10, rates=None, burst=None):
+        """
+        Parameters
+        ----------
+        default_rate : float
+            Requests per second allowed to a host not listed in `rates`.
+        rates : dictionary
+            Requests per second by base URL, for example,
+            {'https://coins.llama.fi': 5}.
+        burst : float
+            Maximum number of requests sent back to back to a host after it
+            has been idle. Defaults to one second's worth of requests.
+        """
+        self.default_rate = default_rate
+        self.rates = dict(rates or {})
+        self.burst = burst
+        self._hosts = dict()
+        self._lock = threading.Lock()
+        self._arrivals = itertools.count()
+
+    def _queue(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = _HostQueue(
+                    self.rates.get(host, self.default_rate), self.burst)
+            return self._hosts[host]
+
+    def acquire(self, host, priority=INTERACTIVE):
+        """Block until a request to `host` may be sent.
+
+        Parameters
+        ----------
+        host : string
+            Base URL of the request.
+        priority : int
+            INTERACTIVE (default) or BULK. Lower values are served first.
+        """
+        queue = self._queue(host)
+        entry = (priority, next(self._arrivals))
+        with queue.cond:
+            heapq.heappush(queue.waiting, entry)
+            while True:
+                if queue.waiting[0] == entry:
+                    wait = queue.bucket.try_acquire()
+                    if not wait:
+                        heapq.heappop(queue.waiting)
+                        # wake the next caller in line
+                        queue.cond.notify_all()
+                        return
+                    queue.cond.wait(timeout=wait)
+                else:
+                    queue.cond.wait()
@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+
+def _positions(keys, rows=None):
+    """ Map each distinct key to the positions (or `rows`) it appears at, in
+    order. Missing keys are left out. """
+    codes, uniques = pd.factorize(keys)
+    rows = np.arange(len(codes)) if rows is None else rows
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(-1, len(uniques)) + 1)
+    # codes of missing keys are -1, so they sort first and are skipped
+    return {key: rows[order[bounds[i]:bounds[i + 1]]]
+            for i, key in enumerate(uniques)}
+
+
+class ProtocolRegistry:
+    """
+    Indexes of the protocols listed by DefiLlama.get_protocols(), built once,
+    to look protocols up by slug, name, parent, category or chain in constant
+    time, and TVL rolled up to parent protocols.
+
+    A parent protocol, such as AAVE, groups several listed protocols, such as
+    AAVE V2 and AAVE V3. Protocols without a parent are their own parent.
+    Parents are identified by slug, the name accepted by `/protocol/{name}`
+    endpoints, e.g., get_protocol_hist_tvl_by_chain().
+
+    Get one with DefiLlama.get_protocol_registry().
+    """
+
+    def __init__(self, protocols):
+        """
+        Parameters
+        ----------
+        protocols : data frame
+            Returned by DefiLlama.get_protocols(). Must have the columns
+            `name`, `category`, `chains` and `tvl`, and may have `slug` and
+            `parentProtocol`.
+        """
+        df = protocols.reset_index(drop=True)
+        self.frame = df
+        names = df['name'].to_numpy(dtype=object)
+        if 'slug' in df:
+            slugs = df['slug'].to_numpy(dtype=object)
+        else:
+            slugs = np.array([name.lower().replace(' ', '-')
+                              for name in names], dtype=object)
+        if 'parentProtocol' in df:
+            parents = df['parentProtocol'].astype(object)\
+                .str.replace('parent#', '', regex=False).to_numpy(dtype=object)
+            parents = np.where(pd.isna(parents), slugs, parents)
+        else:
+            parents = slugs
+        self.slugs = slugs
+        self.parents = parents
+
+        # name lookups are case-insensitive, slugs win over names
+        self._by_name = {name.lower(): i for i, name in enumerate(names)
+                         if isinstance(name, str)}
+        self._by_slug = {slug.lower(): i for i, slug in enumerate(slugs)
+                         if isinstance(slug, str)}
+        self._by_parent = _positions(parents)
+        self._by_category = _positions(df['category'].to_numpy(dtype=object))
+        chains = [cc if isinstance(cc, list) else [] for cc in df['chains']]
+        self._by_chain = _positions(
+            np.array([c for cc in chains for c in cc], dtype=object),
+            rows=np.repeat(np.arange(len(df)), [len(cc) for cc in chains]))
+
+        # TVL by parent, as integer codes and weights for np.bincount
+        self._parent_codes, self._parent_slugs = pd.factorize(parents)
+        self._tvl = df['tvl'].to_numpy(dtype=float, na_value=np.nan)
+        self._parent_tvl = self._rollup(np.ones(len(df), dtype=bool))
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _position(self, protocol):
+        key = protocol.lower()
+        if key in self._by_slug:
+            return self._by_slug[key]
+        if key in self._by_name:
+            return self._by_name[key]
+        raise KeyError(f'Unknown protocol: {protocol}')
+
+    def _rollup(self, keep):
+        tvl = np.bincount(self._parent_codes,
+                          weights=np.where(keep, np.nan_to_num(self._tvl), 0),
+                          minlength=len(self._parent_slugs))
+        n = np.bincount(self._parent_codes, weights=keep,
+                        minlength=len(self._parent_slugs))
+        ss = pd.Series(tvl, index=pd.Index(self._parent_slugs, name='parent'),
+                       name='tvl')[n > 0]
+        return ss.sort_values(ascending=False, kind='stable')
+
+    def get(self, protocol):
+        """Look up a protocol.
+
+        Parameters
+        ----------
+        protocol : string
+            Slug or name of the protocol, case-insensitive.
+
+        Returns
+        -------
+        series, the protocol's row of get_protocols()
+        """
+        return self.frame.iloc[self._position(protocol)]
+
+    def slug(self, protocol):
+        """Get the slug of a protocol, the name accepted by `/protocol/{name}`
+        endpoints.
+
+        Parameters
+        ----------
+        protocol : string
+            Slug or name of the protocol, case-insensitive.
+
+        Returns
+        -------
+        string
+        """
+        return self.slugs[self._position(protocol)]
+
+    def parent(self, protocol):
+        """Get the slug of a protocol's parent, or its own slug if it has no
+        parent.
+
+        Parameters
+        ----------
+        protocol : string
+            Slug or name of the protocol, case-insensitive.
+
+        Returns
+        -------
+        string
+        """
+        return self.parents[self._position(protocol)]
+
+    def children(self, parent):
+        """Get the protocols grouped under a parent protocol.
+
+        Parameters
+        ----------
+        parent : string
+            Slug of the parent protocol, for example, 'aave'.
+
+        Returns
+        -------
+        data frame, rows of get_protocols()
+        """
+        return self.frame.iloc[self._by_parent.get(parent, [])]
+
+    def select(self, chain=None, category=None):
+        """Get the protocols on a chain and/or in a category.
+
+        Parameters
+        ----------
+        chain : string
+            Chain name, for example, 'Ethereum'. Any chain if None.
+        category : string
+            Category, for example, 'Lending'. Any category if None.
+
+        Returns
+        -------
+        data frame, rows of get_protocols()
+        """
+        rows = np.arange(len(self.frame))
+        if chain is not None:
+            rows = self._by_chain.get(chain, rows[:0])
+        if category is not None:
+            rows = np.intersect1d(
+                rows, self._by_category.get(category, rows[:0]))
+        return self.frame.iloc[rows]
+
+    def parent_tvl(self, exclude_categories=None):
+        """Get TVL rolled up to parent protocols.
+
+        Parameters
+        ----------
+        exclude_categories : list
+            Categories of protocols left out of the rollup, for example,
+            ['CEX', 'Chain'].
+
+        Returns
+        -------
+        series of TVL indexed by parent slug, in descending order
+        """
+        if not exclude_categories:
+            return self._parent_tvl.copy()
+        keep = ~self.frame['category'].isin(exclude_categories).to_numpy()
+        return self._rollup(keep)
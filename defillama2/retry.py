@@ -0,0 +1,184 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+
+# HTTP statuses worth retrying: rate limited, or a temporary server problem
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class ApiError(requests.HTTPError):
+    """ HTTP error status returned by a DeFiLlama API. """
+
+    def __init__(self, url, status, retry_after=None):
+        """
+        Parameters
+        ----------
+        url : string
+            Requested URL.
+        status : int
+            HTTP status code.
+        retry_after : string
+            Value of the `Retry-After` response header, if any.
+        """
+        super().__init__(f'{status} error for url: {url}')
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(requests.RequestException):
+    """ Raised without sending a request when a host has failed repeatedly. """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one host. After `failure_threshold` failures in a row
+    the circuit opens and calls fail immediately with CircuitOpenError. Once
+    `reset_timeout` seconds have passed, one trial call is let through: the
+    circuit closes if it succeeds and stays open for another `reset_timeout`
+    seconds if it fails.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self, host=''):
+        """Raise CircuitOpenError if calls to the host should fail fast."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f'{host} failed {self._failures} times in a row, not '
+                    f'sending requests for {self.reset_timeout} seconds.')
+            # let one trial call through, the others keep failing fast
+            self._opened_at = now
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Retries failed requests with exponential backoff and full jitter, and
+    keeps a circuit breaker per host. 429 and 5xx responses, timeouts and
+    connection errors are retried; a `Retry-After` header is honored. Other
+    errors are raised right away.
+    """
+
+    def __init__(self, max_retries=4, backoff_factor=0.5, max_backoff=30,
+                 statuses=RETRY_STATUSES, failure_threshold=5,
+                 reset_timeout=30):
+        """
+        Parameters
+        ----------
+        max_retries : int
+            Maximum number of retries per request. Use 0 to not retry.
+        backoff_factor : float
+            Seconds to wait before the first retry, doubled on every retry.
+            The actual wait is drawn uniformly between 0 and this value.
+        max_backoff : float
+            Maximum seconds to wait between retries, unless the server asks
+            for more with `Retry-After`.
+        statuses : tuple
+            HTTP statuses to retry.
+        failure_threshold : int
+            Number of failures in a row that opens a host's circuit breaker.
+            Rate-limited (429) responses don't count as failures.
+        reset_timeout : float
+            Seconds a host's circuit breaker stays open.
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.statuses = statuses
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = dict()
+        self._lock = threading.Lock()
+
+    def breaker(self, host):
+        """ Circuit breaker of a host, created on first use. """
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(
+                    self.failure_threshold, self.reset_timeout)
+            return self._breakers[host]
+
+    @staticmethod
+    def _parse_retry_after(value):
+        """ Seconds to wait according to a `Retry-After` header, which holds
+        either seconds or an HTTP date. """
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            pass
+        try:
+            dt = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(dt.timestamp() - time.time(), 0)
+
+    def _backoff(self, attempt):
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+    def call(self, func, host=''):
+        """Call `func`, retrying it on transient errors.
+
+        Parameters
+        ----------
+        func : callable
+            Function of no arguments that sends the request.
+        host : string
+            Base URL of the request, used to pick the circuit breaker.
+
+        Returns
+        -------
+        whatever `func` returns
+        """
+        breaker = self.breaker(host)
+        attempt = 0
+        while True:
+            breaker.before_call(host)
+            try:
+                result = func()
+            except ApiError as e:
+                # 4xx means the host is healthy; 429 that we're sending too fast
+                if e.status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if e.status not in self.statuses or attempt >= self.max_retries:
+                    raise
+                wait = max(self._parse_retry_after(e.retry_after) or 0,
+                           self._backoff(attempt))
+            except (requests.ConnectionError, requests.Timeout,
+                    ConnectionError, TimeoutError):
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                wait = self._backoff(attempt)
+            else:
+                breaker.record_success()
+                return result
+            time.sleep(wait)
+            attempt += 1
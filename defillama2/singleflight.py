@@ -0,0 +1,58 @@
+import threading
+
+
+class _Call:
+    """ A call in flight, and its outcome once it's done. """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: while a call for a key is in flight,
+    other threads asking for the same key wait for it and get its result (or
+    its exception) instead of making the call again.
+    """
+
+    def __init__(self):
+        self._calls = dict()
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Call `func`, unless a call for `key` is already in flight, in which
+        case wait for that call and return its result.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the call.
+        func : callable
+            Function of no arguments.
+
+        Returns
+        -------
+        whatever `func` returns, shared by every caller waiting on `key`
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,110 @@
+import threading
+
+import pandas as pd
+
+
+class ProtocolSnapshot:
+    """
+    One download of a protocol's `/protocol/{name}` document, which holds the
+    TVL, token and tokensInUsd histories of every chain the protocol is on.
+    Data frame views of it are built the first time they're asked for and
+    kept, so asking for several views, or the same view again, downloads and
+    parses the document only once.
+
+    Get one with DefiLlama.get_protocol_snapshot(). Returned data frames are
+    shared by all callers of the same view, so copy them before modifying
+    them. They are compact if the client is, see DefiLlama(compact=True).
+    """
+
+    def __init__(self, resp, llama):
+        """
+        Parameters
+        ----------
+        resp : dictionary
+            Response of `/protocol/{name}`. Not modified.
+        llama : DefiLlama
+            Client that downloaded `resp`, used to clean data frames.
+        """
+        self.resp = resp
+        self.name = resp.get('name')
+        self._llama = llama
+        self._views = dict()
+        self._lock = threading.RLock()
+
+    def _view(self, key, build):
+        """ Get view `key`, calling `build` to make it the first time. """
+        with self._lock:
+            if key not in self._views:
+                self._views[key] = self._llama._compact(build())
+            return self._views[key]
+
+    @property
+    def chains(self):
+        """ Chains the protocol has TVL on, excluding 'staking'. """
+        return [chain for chain in self.resp['currentChainTvls']
+                if chain != 'staking']
+
+    def curr_tvl_by_chain(self):
+        """Current TVL of the protocol on each chain.
+
+        Returns
+        -------
+        data frame with a `tvl` column, indexed by chain
+        """
+        def build():
+            ss = pd.Series({chain: self.resp['currentChainTvls'][chain]
+                            for chain in self.chains}, dtype=float)
+            ss.name = 'tvl'
+            return ss.to_frame()
+        return self._view('curr_tvl_by_chain', build)
+
+    def hist_tvl(self, chain):
+        """Historical TVL of the protocol on one chain.
+
+        Parameters
+        ----------
+        chain : string
+            Chain name, one of `chains`.
+
+        Returns
+        -------
+        data frame with a `tvl` column, indexed by date
+        """
+        def build():
+            return self._llama._tidy_frame_tvl(
+                pd.DataFrame(self.resp['chainTvls'][chain]['tvl']))
+        return self._view(('hist_tvl', chain), build)
+
+    def hist_tvl_by_chain(self):
+        """Historical TVL of the protocol on each chain.
+
+        Returns
+        -------
+        dict of data frames, one per chain
+        """
+        return {chain: self.hist_tvl(chain) for chain in self.chains}
+
+    def tokens(self, chain=None, usd=False):
+        """Historical breakdown of the protocol's TVL by token.
+
+        Parameters
+        ----------
+        chain : string
+            Chain name, one of `chains`. Defaults to all chains combined.
+        usd : bool
+            If True, amounts are in USD, otherwise in token units.
+
+        Returns
+        -------
+        data frame where each row is a date and each column is a token
+        """
+        def build():
+            key = 'tokensInUsd' if usd else 'tokens'
+            dd = self.resp if chain is None else self.resp['chainTvls'][chain]
+            rows = dd.get(key) or []
+            df = pd.DataFrame([row['tokens'] for row in rows], dtype=float,
+                              index=pd.to_datetime([row['date'] for row in rows],
+                                                   unit='s', utc=True))
+            df.index.name = 'date'
+            return df
+        return self._view(('tokens', chain, usd), build)
@@ -0,0 +1,134 @@
+import os
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+
+class PriceStore:
+    """
+    Local columnar store of hourly token prices, one Parquet file per
+    chain:token_address under `path/{chain}/{token_address}.parquet`. Each
+    file has three columns: `timestamp` (unix seconds at the top of the hour),
+    `price` and `symbol`. Hours that DeFiLlama has no price for are stored with
+    a missing price so that they aren't requested again.
+
+    Fill it with DefiLlama.sync_tokens_hist_prices() and read it with read().
+    Requires pyarrow (`pip install defillama2[parquet]`).
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory holding the store. Created if it doesn't exist.
+        """
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, coin):
+        chain, token_address = coin.split(':', 1)
+        return os.path.join(self.path, quote(chain, safe=''),
+                            quote(token_address, safe='') + '.parquet')
+
+    def load(self, coin, columns=None):
+        """Load all stored hours of a token.
+
+        Parameters
+        ----------
+        coin : string
+            chain:token_address
+        columns : list
+            Columns to load. Loads all columns if None.
+
+        Returns
+        -------
+        data frame, empty if nothing is stored for the token
+        """
+        fname = self._file(coin)
+        if not os.path.exists(fname):
+            return pd.DataFrame({'timestamp': np.array([], dtype=np.int64),
+                                 'price': np.array([], dtype=float),
+                                 'symbol': np.array([], dtype=object)}
+                                ).loc[:, columns or slice(None)]
+        return pd.read_parquet(fname, columns=columns)
+
+    def missing_hours(self, coin, hours):
+        """Find hours that are not stored yet.
+
+        Parameters
+        ----------
+        coin : string
+            chain:token_address
+        hours : array of int
+            Unix timestamps in seconds at the top of the hour.
+
+        Returns
+        -------
+        sorted array of int
+        """
+        stored = self.load(coin, columns=['timestamp'])['timestamp'].to_numpy()
+        return np.setdiff1d(np.asarray(hours, dtype=np.int64), stored)
+
+    def append(self, coin, df):
+        """Add hours to a token's file, replacing hours already stored.
+
+        Parameters
+        ----------
+        coin : string
+            chain:token_address
+        df : data frame
+            Must contain columns `timestamp` (unix seconds at the top of the
+            hour), `price` and `symbol`.
+        """
+        df = pd.concat([self.load(coin), df.loc[:, ['timestamp', 'price',
+                                                     'symbol']]])
+        df = df.drop_duplicates('timestamp', keep='last')\
+            .sort_values('timestamp').reset_index(drop=True)
+        df['timestamp'] = df['timestamp'].astype(np.int64)
+        fname = self._file(coin)
+        os.makedirs(os.path.dirname(fname), exist_ok=True)
+        # write to a temporary file first so readers never see a partial file
+        df.to_parquet(fname + '.tmp', index=False)
+        os.replace(fname + '.tmp', fname)
+
+    def read(self, token_addrs_n_chains, start=None, end=None):
+        """Read stored hourly prices of tokens. Data on both the starting and
+        end dates are included.
+
+        Parameters
+        ----------
+        token_addrs_n_chains : dictionary
+            Each key is a token address; each value is a chain where the token
+            address resides. For example,
+            {'0xdF574c24545E5FfEcb9a659c229253D4111d87e1':'ethereum',
+             'ethereum':'coingecko'}
+        start : string
+            Start date, for example, '2022-11-01'. Reads from the earliest
+            stored hour if None.
+        end : string
+            End date, for example, '2022-11-30'. Reads up to the latest stored
+            hour if None.
+
+        Returns
+        -------
+        data frame where each row is a datetime and each column is a token
+        """
+        lo = -np.inf if start is None else \
+            pd.to_datetime(start, format='%Y-%m-%d', utc=True).timestamp()
+        hi = np.inf if end is None else \
+            (pd.to_datetime(end, format='%Y-%m-%d', utc=True)
+             + pd.Timedelta(days=1)).timestamp()
+        lst = []
+        for k, v in token_addrs_n_chains.items():
+            df = self.load(f'{v}:{k}')
+            df = df[(df['timestamp'] >= lo) & (df['timestamp'] < hi)]
+            lst.append(df.dropna(subset=['price']))
+        df = pd.concat(lst)
+        df = df.groupby(['timestamp', 'symbol'])['price'].mean().reset_index()\
+            .pivot(index='timestamp', columns='symbol', values='price')
+        df.columns.name = None
+        df.index = pd.to_datetime(df.index, unit='s', utc=True)
+        df.index.name = 'datetime'
+        return df
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Response:
+    """ Raw HTTP response returned by a transport. """
+
+    def __init__(self, url, status, headers, content):
+        """
+        Parameters
+        ----------
+        url : string
+            Requested URL, including the query string.
+        status : int
+            HTTP status code.
+        headers : dictionary
+            Response headers, looked up case-insensitively.
+        content : bytes
+            Raw response body.
+        """
+        self.url = url
+        self.status = status
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+
+class Transport:
+    """
+    Sends HTTP 'GET' requests for DefiLlama. Subclass it and implement
+    fetch() to change how requests are sent, for example to intercept them.
+    """
+
+    def fetch(self, url, params=None):
+        """Send 'GET' request.
+
+        Parameters
+        ----------
+        url : string
+            Full URL, including base URL and endpoint.
+        params : dictionary or string
+            HTTP request parameters.
+
+        Returns
+        -------
+        Response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release resources held by the transport."""
+
+
+class RequestsTransport(Transport):
+    """ Sends requests with a requests.Session, reusing connections. """
+
+    def __init__(self, pool_maxsize=10, timeout=30):
+        """
+        Parameters
+        ----------
+        pool_maxsize : int
+            Maximum number of connections kept open per host.
+        timeout : float
+            Seconds to wait for the server.
+        """
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.timeout = timeout
+
+    def fetch(self, url, params=None):
+        resp = self.session.request('GET', url, params=params,
+                                    timeout=self.timeout)
+        return Response(resp.url, resp.status_code, resp.headers,
+                        resp.content)
+
+    def close(self):
+        self.session.close()
+
+
+def _recording_name(url, params):
+    """ File name (without extension) of a recorded response. """
+    if params and not isinstance(params, str):
+        params = urlencode(sorted(params.items()))
+    key = f'{url}?{params or ""}'
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class RecordingTransport(Transport):
+    """
+    Sends requests with another transport and saves every response under
+    `path`, so that ReplayTransport can serve them later without network
+    access. Each response is saved as `<hash>.body` (raw bytes) and
+    `<hash>.json` (URL, status and headers).
+    """
+
+    def __init__(self, path, transport=None):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory to save responses in. Created if it doesn't exist.
+        transport : Transport
+            Transport that sends the requests. Defaults to RequestsTransport().
+        """
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+        self.transport = transport if transport is not None \
+            else RequestsTransport()
+
+    def fetch(self, url, params=None):
+        resp = self.transport.fetch(url, params=params)
+        fname = os.path.join(self.path, _recording_name(url, params))
+        with open(fname + '.body', 'wb') as f:
+            f.write(resp.content)
+        with open(fname + '.json', 'w') as f:
+            json.dump(dict(url=resp.url, status=resp.status,
+                           headers=dict(resp.headers)), f)
+        return resp
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayMissError(LookupError):
+    """ Raised by ReplayTransport for a request that wasn't recorded. """
+
+
+class ReplayTransport(Transport):
+    """
+    Serves responses saved by RecordingTransport, without network access.
+    Requests that weren't recorded raise ReplayMissError.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : string
+            Directory holding the recorded responses.
+        """
+        self.path = os.path.expanduser(path)
+
+    def fetch(self, url, params=None):
+        fname = os.path.join(self.path, _recording_name(url, params))
+        try:
+            with open(fname + '.json') as f:
+                meta = json.load(f)
+            with open(fname + '.body', 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            raise ReplayMissError(
+                f'No recorded response for {url} with params {params!r} in '
+                f'{self.path}') from None
+        return Response(meta['url'], meta['status'], meta['headers'], content)
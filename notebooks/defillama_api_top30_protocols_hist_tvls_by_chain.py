@@ -3,38 +3,32 @@
 # TVLs by chain.
 
 from defillama2 import DefiLlama
-import numpy as np
+import pandas as pd
 
 # initialize api client
 llama = DefiLlama()
-# get all protocols
-df = llama.get_protocols() 
+# index all protocols
+registry = llama.get_protocol_registry()
+df = registry.frame
 
 # check protocol categories
 df['category'].unique()
 
-# exclude CEX and Chain categories
-exclude_cats = ['CEX', 'Chain']
-df = df[~df['category'].isin(exclude_cats)]
-
-# df is granular. For example, AAVE is broken down by AAVE V2 
-# and V3; Uniswap is broken down by Uniswap V3 and V3. So we 
-# want to aggregate TVL based on parent protocol first. If you pass
-# the granular name, say AAVE V2, to get_protocol() or 
-# get_protocol_hist_tvl_by_chain(), you'd get an error because the api
-# only recognize the parent protocol, which is just AAVE in this case.
-xs = df['parentProtocol'].str.replace('parent#', '')
-parent_protocols = np.where(xs.isna(), df['name'], xs)
-protocols_by_tvl = df.groupby(parent_protocols)['tvl'].sum()\
-    .sort_values(ascending=False)
+# registry.frame is granular. For example, AAVE is broken down by AAVE V2 
+# and V3; Uniswap is broken down by Uniswap V2 and V3. So we aggregate TVL 
+# by parent protocol, excluding CEX and Chain categories. The rollup is 
+# indexed by slug, the name recognized by get_protocol() and 
+# get_protocol_hist_tvl_by_chain(), e.g., 'aave' for AAVE.
+protocols_by_tvl = registry.parent_tvl(exclude_categories=['CEX', 'Chain'])
 
 # get historical tvls by chain for the top 30 protocols
 top30 = protocols_by_tvl.head(30).index.to_list()
-# replace space with dash to be recognized by the api
-top30 = [string.replace(' ', '-') for string in top30]
-     
-for name in top30[8:]:
-    historical_tvl_by_chain = llama.get_protocol_hist_tvl_by_chain(protocol=name)
-    for chain, frame in historical_tvl_by_chain.items():
-        frame.to_csv(name+'-'+chain+'.csv')
 
+# download historical tvls by chain of the top 30 protocols, several at a 
+# time, into a Parquet dataset partitioned by protocol and chain, e.g., 
+# top30/protocol=aave/chain=Ethereum/part-0.parquet. Requires pyarrow 
+# (`pip install defillama2[parquet]`).
+llama.write_protocols_hist_tvl_by_chain('top30', top30)
+
+# read it back as one frame with columns date, tvl, protocol and chain
+tvls = pd.read_parquet('top30')
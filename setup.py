@@ -6,6 +6,8 @@ VERSION = '0.7.5'
 
 packages = ['defillama2']
 requires = ['requests>=2.28.1', 'pandas>=1.4.4', 'numpy>=1.22.4']
+extras = {'async': ['aiohttp>=3.8'], 'parquet': ['pyarrow>=8.0.0'],
+          'test': ['pytest>=7']}
 
 with open('README.md', mode='r') as f:
     readme = f.read()
@@ -21,6 +23,7 @@ setup(
     author_email="<coindataschool@gmail.com>",
     packages=packages,
     install_requires=requires, # dependencies    
+    extras_require=extras, # optional dependencies
     keywords=['python 3', 'defillama', 'api'],
     classifiers= [
         "Programming Language :: Python :: 3",
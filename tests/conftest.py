@@ -0,0 +1,23 @@
+import pytest
+
+from defillama2 import DefiLlama, RetryPolicy
+
+from stubs import StubTransport
+
+
+@pytest.fixture
+def make_llama():
+    """ Build a DefiLlama served by a StubTransport, without rate limiting or
+    retry waits. Returns the client and the transport. """
+    clients = []
+
+    def make(handler, **kwargs):
+        transport = StubTransport(handler)
+        kwargs.setdefault('max_calls_per_sec', None)
+        kwargs.setdefault('retry', RetryPolicy(max_retries=0))
+        llama = DefiLlama(transport=transport, **kwargs)
+        clients.append(llama)
+        return llama, transport
+    yield make
+    for llama in clients:
+        llama.close()
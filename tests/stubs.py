@@ -0,0 +1,37 @@
+import json
+import threading
+from urllib.parse import parse_qs
+
+from defillama2.transport import Response, Transport
+
+
+class StubTransport(Transport):
+    """
+    Serves every request with `handler(url, params)`, which returns either a
+    Response or a JSON-serializable body sent with status 200, and records
+    the requests it was sent.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def fetch(self, url, params=None):
+        with self._lock:
+            self.requests.append((url, params))
+        res = self.handler(url, params)
+        if isinstance(res, Response):
+            return res
+        return Response(url, 200, {}, json.dumps(res).encode())
+
+    @property
+    def urls(self):
+        """ Full URL of each request, including the query string. """
+        return [url + (f'?{params}' if params else '')
+                for url, params in self.requests]
+
+
+def batch_coins(params):
+    """ `coins` parameter of a /batchHistorical request, decoded. """
+    return json.loads(parse_qs(params)['coins'][0])
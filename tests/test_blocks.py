@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+
+from defillama2 import BlockIndex
+from defillama2.transport import Response
+
+GENESIS = 1438269973
+
+
+def block_handler(url, params):
+    """ Chain with a block every 12 seconds, which rejects future
+    timestamps like DeFiLlama does. """
+    ts = int(float(url.rsplit('/', 1)[1]))
+    if ts > time.time():
+        return Response(url, 400, {}, b'{}')
+    height = (ts - GENESIS) // 12
+    return {'height': height, 'timestamp': GENESIS + 12 * height}
+
+
+def true_heights(timestamps):
+    return (np.asarray(timestamps) - GENESIS) // 12
+
+
+def test_last_seconds_dont_request_future_blocks(make_llama):
+    llama, transport = make_llama(block_handler, block_index=BlockIndex())
+    now = int(time.time())
+    timestamps = np.arange(now - 19, now + 1)
+
+    df = llama.get_closest_blocks('ethereum', timestamps, tolerance=60)
+
+    assert np.abs(df['height'] - true_heights(timestamps)).max() <= 1
+    for url in transport.urls:
+        assert int(url.rsplit('/', 1)[1]) <= now
+
+
+def test_recent_timestamps_are_interpolated_from_edges(make_llama):
+    llama, transport = make_llama(block_handler, block_index=BlockIndex())
+    now = int(time.time())
+    rng = np.random.default_rng(0)
+    timestamps = rng.choice(np.arange(now - 600, now), 85, replace=False)
+
+    df = llama.get_closest_blocks('ethereum', timestamps, tolerance=60)
+
+    assert np.abs(df['height'] - true_heights(timestamps)).max() <= 1
+    # about two edges per 30 s cell, each requested once
+    assert len(transport.requests) <= 600 // 30 + 2
+    assert len(set(transport.urls)) == len(transport.urls)
+
+
+def test_index_answers_repeat_lookups(make_llama):
+    llama, transport = make_llama(block_handler, block_index=BlockIndex())
+    day_ago = int(time.time()) - 24 * 3600
+    timestamps = day_ago + np.arange(0, 3600, 7)
+
+    first = llama.get_closest_blocks('ethereum', timestamps, tolerance=60)
+    n = len(transport.requests)
+    second = llama.get_closest_blocks('ethereum', timestamps, tolerance=60)
+
+    assert n < len(timestamps)
+    assert len(transport.requests) == n
+    assert first.equals(second)
+    assert np.abs(first['height'] - true_heights(timestamps)).max() <= 1
@@ -0,0 +1,61 @@
+import numpy as np
+
+from defillama2 import DefiLlama
+from defillama2.defillama2 import MAX_BATCH_POINTS, MAX_URL_LENGTH
+
+from stubs import batch_coins
+
+
+def coin_timestamps(n_coins, n_timestamps, seed=0):
+    rng = np.random.default_rng(seed)
+    start = 1640995200
+    return {f'ethereum:0x{i:040x}':
+            sorted((start + 3600 * rng.choice(20000, n_timestamps,
+                                              replace=False)).tolist())
+            for i in range(n_coins)}
+
+
+def pairs(dd):
+    return sorted((coin, ts) for coin, tss in dd.items() for ts in tss)
+
+
+def test_plan_keeps_requests_within_limits():
+    llama = DefiLlama(max_calls_per_sec=None)
+    for n_coins, n_timestamps in [(1, 5000), (40, 300), (300, 7), (2, 3)]:
+        dd = coin_timestamps(n_coins, n_timestamps)
+        plan = llama._plan_batch_historical(dd)
+        for coins in plan:
+            assert sum(len(tss) for tss in coins.values()) <= MAX_BATCH_POINTS
+        # every pair is requested exactly once
+        assert sorted(p for coins in plan for p in pairs(coins)) == pairs(dd)
+    llama.close()
+
+
+def test_sent_urls_stay_within_max_url_length(make_llama):
+    def handler(url, params):
+        return {'coins': {coin: {'symbol': 'X', 'prices': [
+            {'timestamp': ts, 'price': 1., 'confidence': 1.} for ts in tss]}
+            for coin, tss in batch_coins(params).items()}}
+    llama, transport = make_llama(handler)
+    # long coin keys make the URL, not the point count, the limit
+    dd = {f'coingecko:{"x" * 60}-{i}': [1640995200 + 3600 * j
+                                        for j in range(20)]
+          for i in range(100)}
+
+    df = llama.get_tokens_hist_batch_prices(dd)
+
+    assert len(transport.requests) > 1
+    assert max(len(url) for url in transport.urls) <= MAX_URL_LENGTH
+    assert len(df) == 100 * 20
+    sent = dict()
+    for _, params in transport.requests:
+        for coin, tss in batch_coins(params).items():
+            sent.setdefault(coin, []).extend(tss)
+    assert pairs(sent) == pairs(dd)
+
+
+def test_plan_of_nothing_is_one_request():
+    llama = DefiLlama(max_calls_per_sec=None)
+    assert llama._plan_batch_historical({'ethereum:0xa': []}) \
+        == [{'ethereum:0xa': []}]
+    llama.close()
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from defillama2 import PriceCache
+from defillama2.cache import IMMUTABLE_AFTER, NO_PRICE_AFTER
+
+from stubs import batch_coins
+
+COIN = 'ethereum:0xdf574c24545e5ffecb9a659c229253d4111d87e1'
+
+
+@pytest.fixture
+def prices(make_llama):
+    """ Client with a PriceCache, served by a stub that has a price for
+    every requested pair once `published` is True. """
+    state = dict(published=False)
+
+    def handler(url, params):
+        if not state['published']:
+            return {'coins': {}}
+        return {'coins': {coin: {'symbol': 'X', 'prices': [
+            {'timestamp': ts, 'price': 2., 'confidence': .99} for ts in tss]}
+            for coin, tss in batch_coins(params).items()}}
+    llama, transport = make_llama(handler, price_cache=PriceCache())
+    return llama, transport, state
+
+
+def test_held_prices_are_not_requested_again(prices):
+    llama, transport, state = prices
+    state['published'] = True
+    old = int(time.time()) - 3 * 24 * 3600
+    dd = {COIN: [old, old + 3600]}
+
+    first = llama.get_tokens_hist_batch_prices(dd)
+    second = llama.get_tokens_hist_batch_prices(dd)
+
+    assert len(transport.requests) == 1
+    assert first.equals(second)
+    # only the missing pair is requested
+    llama.get_tokens_hist_batch_prices({COIN: [old, old + 7200]})
+    assert len(transport.requests) == 2
+    assert batch_coins(transport.requests[-1][1]) == {COIN: [old + 7200]}
+
+
+def test_late_published_price_is_fetched(prices):
+    # younger than a day: DeFiLlama may publish it later
+    llama, transport, state = prices
+    ts = int(time.time()) - 2 * 3600
+    dd = {COIN: [ts]}
+
+    assert llama.get_tokens_hist_batch_prices(dd).empty
+    state['published'] = True
+    df = llama.get_tokens_hist_batch_prices(dd)
+
+    assert len(transport.requests) == 2
+    assert df['price'].tolist() == [2.]
+
+
+def test_recent_prices_are_not_cached(prices):
+    llama, transport, state = prices
+    state['published'] = True
+    dd = {COIN: [int(time.time()) - IMMUTABLE_AFTER // 2]}
+
+    llama.get_tokens_hist_batch_prices(dd)
+    llama.get_tokens_hist_batch_prices(dd)
+
+    assert len(transport.requests) == 2
+
+
+def test_old_pairs_without_price_are_remembered(prices):
+    llama, transport, state = prices
+    dd = {COIN: [int(time.time()) - NO_PRICE_AFTER - 3600]}
+
+    assert llama.get_tokens_hist_batch_prices(dd).empty
+    assert llama.get_tokens_hist_batch_prices(dd).empty
+
+    assert len(transport.requests) == 1
+
+
+def test_snapshot_prices_are_cached(make_llama):
+    def handler(url, params):
+        ts = int(float(url.split('/')[-2]))
+        return {'coins': {COIN: {'price': 2., 'symbol': 'X',
+                                 'timestamp': ts, 'confidence': .99}}}
+    llama, transport = make_llama(handler, price_cache=PriceCache())
+    token = {COIN.split(':')[1]: 'ethereum'}
+
+    for _ in range(2):
+        df = llama.get_tokens_hist_snapshot_prices(token, '2022-09-15 13:25:43')
+    assert len(transport.requests) == 1
+    assert df['price'].tolist() == [2.]
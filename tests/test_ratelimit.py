@@ -0,0 +1,57 @@
+import threading
+import time
+
+from defillama2 import BULK, INTERACTIVE, RequestScheduler
+from defillama2.ratelimit import TokenBucket
+
+
+def wait_for_waiters(scheduler, host, n):
+    """ Block until `n` callers are queued for `host`. """
+    queue = scheduler._queue(host)
+    while True:
+        with queue.cond:
+            if len(queue.waiting) >= n:
+                return
+        time.sleep(0.001)
+
+
+def test_interactive_requests_jump_ahead_of_bulk():
+    host = 'https://coins.llama.fi'
+    scheduler = RequestScheduler(default_rate=20, burst=1)
+    scheduler.acquire(host) # use up the burst
+    order = []
+
+    def acquire(name, priority):
+        scheduler.acquire(host, priority)
+        order.append(name)
+
+    threads = []
+    for i in range(3):
+        threads.append(threading.Thread(target=acquire,
+                                        args=(f'bulk{i}', BULK)))
+        threads[-1].start()
+        wait_for_waiters(scheduler, host, i + 1)
+    threads.append(threading.Thread(target=acquire,
+                                    args=('interactive', INTERACTIVE)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ['interactive', 'bulk0', 'bulk1', 'bulk2']
+
+
+def test_hosts_have_their_own_budget():
+    scheduler = RequestScheduler(default_rate=1, burst=1)
+    start = time.monotonic()
+    scheduler.acquire('https://coins.llama.fi')
+    scheduler.acquire('https://yields.llama.fi')
+    assert time.monotonic() - start < 0.5
+
+
+def test_token_bucket_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # the first token is there already, the other 5 take 1/50 s each
+    assert 0.08 <= time.monotonic() - start < 0.5
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from defillama2 import DefiLlama
+
+
+def hourly_prices(seed=0):
+    """ Hourly prices of 3 tokens over 3 weeks, with missing hours: a gap
+    across midnight, a whole missing day for one token, and scattered NaN. """
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2022-01-01', '2022-01-21 23:00', freq='h',
+                          tz='UTC')
+    df = pd.DataFrame(rng.lognormal(size=(len(index), 3)), index=index,
+                      columns=['ETH', 'USDC', 'WBTC'])
+    df.iloc[rng.choice(len(df), 60, replace=False), 1] = np.nan
+    df.loc['2022-01-05', 'WBTC'] = np.nan
+    # rows missing altogether, as when no token has a price
+    gap = (df.index >= '2022-01-02 20:00') & (df.index < '2022-01-03 11:00')
+    return df[~gap]
+
+
+@pytest.mark.parametrize('freq', ['D', '4h', 'W'])
+def test_matches_pandas_resample(freq):
+    df = hourly_prices()
+    res = DefiLlama(max_calls_per_sec=None)._resample_prices(df, freq)
+
+    resampler = df.resample(freq)
+    expected = {'open': resampler.first(), 'low': resampler.min(),
+                'high': resampler.max(), 'close': resampler.last(),
+                'median': resampler.median(), 'mean': resampler.mean(),
+                'std': resampler.std()}
+    assert list(res.columns.get_level_values(0).unique()) == list(expected)
+    for stat, frame in expected.items():
+        pd.testing.assert_frame_equal(res[stat], frame, check_freq=False,
+                                      check_names=False, rtol=1e-9)
+
+
+def test_close_comes_from_its_own_period():
+    df = hourly_prices()
+    res = DefiLlama(max_calls_per_sec=None)._resample_prices(df, 'D')
+    # 2022-01-02 has no prices after 19:00, so it closes at 19:00, and
+    # 2022-01-03 opens at 11:00, after the gap
+    day = pd.Timestamp('2022-01-02', tz='UTC')
+    assert res.loc[day, ('close', 'ETH')] \
+        == df.loc['2022-01-02 19:00', 'ETH'].item()
+    assert res.loc[day + pd.Timedelta(days=1), ('open', 'ETH')] \
+        == df.loc['2022-01-03 11:00', 'ETH'].item()
+    # a day without any price is all NaN
+    assert res.loc[pd.Timestamp('2022-01-05', tz='UTC')]\
+        .xs('WBTC', level=1).isna().all()
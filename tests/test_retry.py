@@ -0,0 +1,105 @@
+import pytest
+
+from defillama2 import ApiError, CircuitOpenError, RetryPolicy
+from defillama2 import retry
+from defillama2.transport import Response
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """ Seconds waited between retries, without actually waiting. """
+    waits = []
+    monkeypatch.setattr(retry.time, 'sleep', waits.append)
+    return waits
+
+
+def test_429_is_retried_after_retry_after(make_llama, sleeps):
+    statuses = [429, 429, 200]
+
+    def handler(url, params):
+        status = statuses.pop(0)
+        if status == 429:
+            return Response(url, 429, {'Retry-After': '7'}, b'')
+        return 12.5
+    llama, transport = make_llama(
+        handler, retry=RetryPolicy(max_retries=4, backoff_factor=0.01))
+
+    assert llama.get_protocol_curr_tvl('aave') == 12.5
+    assert len(transport.requests) == 3
+    # the server asked for more than the backoff
+    assert sleeps == [7, 7]
+
+
+def test_retries_give_up_after_max_retries(make_llama, sleeps):
+    llama, transport = make_llama(
+        lambda url, params: Response(url, 503, {}, b''),
+        retry=RetryPolicy(max_retries=2, backoff_factor=0.01))
+
+    with pytest.raises(ApiError) as info:
+        llama.get_protocol_curr_tvl('aave')
+    assert info.value.status == 503
+    assert len(transport.requests) == 3
+    assert all(0 <= wait <= 0.04 for wait in sleeps)
+
+
+def test_client_errors_are_not_retried(make_llama, sleeps):
+    llama, transport = make_llama(
+        lambda url, params: Response(url, 404, {}, b''),
+        retry=RetryPolicy(max_retries=4))
+
+    with pytest.raises(ApiError):
+        llama.get_protocol_curr_tvl('aave')
+    assert len(transport.requests) == 1
+    assert sleeps == []
+
+
+def test_retry_after_http_date():
+    assert RetryPolicy._parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') \
+        == 0
+    assert RetryPolicy._parse_retry_after('2.5') == 2.5
+    assert RetryPolicy._parse_retry_after('soon') is None
+
+
+def test_circuit_breaker_opens_then_lets_one_trial_call_through(
+        monkeypatch, sleeps):
+    now = [1000.]
+    monkeypatch.setattr(retry.time, 'monotonic', lambda: now[0])
+    policy = RetryPolicy(max_retries=0, failure_threshold=3, reset_timeout=30)
+    calls = []
+
+    def failing():
+        calls.append('fail')
+        raise ConnectionError('down')
+
+    def working():
+        calls.append('ok')
+        return 'ok'
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            policy.call(failing, host='https://coins.llama.fi')
+    # open: calls fail fast without being made
+    with pytest.raises(CircuitOpenError):
+        policy.call(working, host='https://coins.llama.fi')
+    assert calls == ['fail'] * 3
+    # other hosts aren't affected
+    assert policy.call(working, host='https://yields.llama.fi') == 'ok'
+
+    # after the timeout one trial call goes through, and while it runs the
+    # others keep failing fast
+    now[0] += 31
+
+    def trial():
+        with pytest.raises(CircuitOpenError):
+            policy.call(working, host='https://coins.llama.fi')
+        raise ConnectionError('still down')
+    with pytest.raises(ConnectionError):
+        policy.call(trial, host='https://coins.llama.fi')
+    # the failed trial keeps it open for another timeout
+    with pytest.raises(CircuitOpenError):
+        policy.call(working, host='https://coins.llama.fi')
+
+    now[0] += 31
+    assert policy.call(working, host='https://coins.llama.fi') == 'ok'
+    # a successful trial closes it
+    assert policy.call(working, host='https://coins.llama.fi') == 'ok'
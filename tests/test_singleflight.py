@@ -0,0 +1,69 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from defillama2.singleflight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        release.wait(5)
+        return {'tvl': 1}
+
+    with ThreadPoolExecutor(8) as pool:
+        futures = [pool.submit(flight.do, 'key', func) for _ in range(8)]
+        time.sleep(0.1)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(calls) == 1
+    # every caller gets the same object
+    assert all(res is results[0] for res in results)
+
+
+def test_errors_are_shared_and_not_remembered():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError('boom')
+
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(flight.do, 'key', failing) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    # once the call is over, the next one is made again
+    assert flight.do('key', lambda: 'ok') == 'ok'
+
+
+def test_identical_requests_share_one_download(make_llama):
+    release = threading.Event()
+
+    def handler(url, params):
+        release.wait(5)
+        return [{'name': 'Aave', 'tvl': 1.}]
+    llama, transport = make_llama(handler)
+
+    with ThreadPoolExecutor(6) as pool:
+        futures = [pool.submit(llama.get_protocols) for _ in range(6)]
+        time.sleep(0.1)
+        release.set()
+        frames = [future.result() for future in futures]
+
+    assert len(transport.requests) == 1
+    assert all(len(df) == 1 for df in frames)
+    # different requests aren't coalesced
+    release.set()
+    llama.get_protocol_curr_tvl('aave')
+    assert len(transport.requests) == 2